@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from sqlalchemy.orm import Session, selectinload, joinedload
 from sqlalchemy import desc, func, select
 from typing import Optional, List
@@ -16,11 +16,14 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.graphics.shapes import Drawing
 from reportlab.graphics.charts.barcharts import VerticalBarChart
 
-from app.core import database
+from app.core import database, profiling
 from app.models import solicitudes as models, users
 from app.schemas import solicitudes as schemas
+from app.services.recomendaciones import motor
+from app.services.analitica_precios import analitica
+from app.services import vencimientos, eventos, importacion, conteos
 
-router = APIRouter(prefix="/admin", tags=["Administración"])
+router = APIRouter(prefix="/admin", tags=["Administración"], route_class=profiling.RutaPerfilada)
 
 # ==============================================================================
 #                                HELPERS
@@ -68,7 +71,7 @@ def get_fast_export_query(db: Session, estado: Optional[str] = None):
 #                        1. GESTIÓN DE POSTULACIONES
 # ==============================================================================
 @router.get("/postulaciones", response_model=List[schemas.PostulacionResponse])
-def ver_postulaciones(db: Session = Depends(database.get_db)):
+def ver_postulaciones(db: Session = Depends(database.get_read_db)):
     return db.query(models.PostulacionAsesor).filter(models.PostulacionAsesor.estado == "Pendiente").all()
 
 @router.put("/postulaciones/{id}/resolver")
@@ -77,6 +80,7 @@ def resolver_postulacion(id: int, aprobada: bool, db: Session = Depends(database
     if not postulacion:
         raise HTTPException(status_code=404, detail="Postulación no encontrada")
 
+    estado_previo = postulacion.estado
     if aprobada:
         postulacion.estado = "Aprobado"
         usuario = db.query(users.Usuario).get(postulacion.usuario_id)
@@ -88,14 +92,21 @@ def resolver_postulacion(id: int, aprobada: bool, db: Session = Depends(database
     else:
         postulacion.estado = "Rechazado"
         mensaje = "Postulación rechazada."
+    nuevo_estado = postulacion.estado
     db.commit()
+
+    eventos.registrar("PostulacionAsesor", id, estado_previo, nuevo_estado)
+
+    if aprobada:
+        # Nuevo asesor: el motor de recomendaciones necesita su perfil
+        motor.invalidar()
     return {"mensaje": mensaje}
 
 # ==============================================================================
 #                        2. ESTADÍSTICAS
 # ==============================================================================
 @router.get("/stats")
-def obtener_stats(db: Session = Depends(database.get_db)):
+def obtener_stats(db: Session = Depends(database.get_read_db)):
     total_usuarios = db.query(func.count(users.Usuario.id)).scalar()
     total_solicitudes = db.query(func.count(models.Solicitud.id)).scalar()
     solicitudes_activas = db.query(func.count(models.Solicitud.id)).filter(
@@ -108,6 +119,86 @@ def obtener_stats(db: Session = Depends(database.get_db)):
         "solicitudes_activas": solicitudes_activas
     }
 
+@router.get("/precios", response_model=List[schemas.PrecioMateriaResponse])
+def obtener_precios(
+    dias: int = Query(30, ge=1, le=3650),
+    refrescar: bool = False,
+    db: Session = Depends(database.get_db)
+):
+    """Percentiles, promedio, tasa de aceptación y tiempo a primera oferta por materia."""
+    return analitica.resumen(db, dias=dias, forzar=refrescar)
+
+@router.get("/replicas")
+def estado_replicas():
+    """Salud de las réplicas de lectura configuradas."""
+    return database.read_router.estado()
+
+@router.get("/vencimientos")
+def metricas_vencimientos():
+    """Métricas del scheduler que vence solicitudes pasadas de fecha_limite."""
+    return vencimientos.metricas
+
+# --- Log de transiciones de estado ---
+ENTIDADES_EVENTOS = ("Solicitud", "Oferta", "PostulacionAsesor")
+
+def validar_entidad(entidad: str):
+    if entidad not in ENTIDADES_EVENTOS:
+        raise HTTPException(status_code=404, detail="Entidad desconocida")
+
+@router.get("/eventos/{entidad}/funnel")
+def funnel_eventos(entidad: str, dias: int = Query(30, ge=1, le=3650), db: Session = Depends(database.get_read_db)):
+    """Cuántas entidades creadas en la ventana alcanzaron cada estado."""
+    validar_entidad(entidad)
+    return eventos.funnel(db, entidad, dias)
+
+@router.get("/eventos/{entidad}/tiempos")
+def tiempos_eventos(entidad: str, db: Session = Depends(database.get_read_db)):
+    """Horas promedio y máximas en cada estado, reconstruidas desde el log."""
+    validar_entidad(entidad)
+    return eventos.tiempo_en_estado(db, entidad)
+
+@router.get("/eventos/{entidad}/{entidad_id}")
+def historial_eventos(entidad: str, entidad_id: int, db: Session = Depends(database.get_read_db)):
+    validar_entidad(entidad)
+    return [
+        {"desde": ev.desde, "hacia": ev.hacia, "actor_id": ev.actor_id, "ts": ev.ts}
+        for ev in eventos.historial(db, entidad, entidad_id)
+    ]
+
+@router.get("/eventos-metricas")
+def metricas_eventos():
+    return eventos.metricas
+
+# --- Perfiles de requests (header X-Profile o muestreo) ---
+def get_perfil(perfil_id: int):
+    perfil = profiling.buscar(perfil_id)
+    if not perfil:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return perfil
+
+@router.get("/perfiles")
+def listar_perfiles():
+    return [p.resumen() for p in reversed(profiling.perfiles)]
+
+@router.get("/perfiles/{perfil_id}/sql")
+def sql_perfil(perfil_id: int):
+    """Sentencias SQL del request, en orden, con su duración."""
+    return get_perfil(perfil_id).sql
+
+@router.get("/perfiles/{perfil_id}/collapsed")
+def perfil_collapsed(perfil_id: int):
+    return PlainTextResponse(
+        profiling.collapsed(get_perfil(perfil_id)),
+        headers={"Content-Disposition": f"attachment; filename=perfil_{perfil_id}.folded"}
+    )
+
+@router.get("/perfiles/{perfil_id}/speedscope")
+def perfil_speedscope(perfil_id: int):
+    return JSONResponse(
+        profiling.speedscope(get_perfil(perfil_id)),
+        headers={"Content-Disposition": f"attachment; filename=perfil_{perfil_id}.speedscope.json"}
+    )
+
 # ==============================================================================
 #                        3. LISTADO PAGINADO (UI)
 # ==============================================================================
@@ -116,15 +207,26 @@ def listar_solicitudes(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
     estado: Optional[str] = None,
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_read_db)
 ):
     offset = (page - 1) * limit
-    
-    count_query = db.query(func.count(models.Solicitud.id))
-    if estado:
-        count_query = count_query.filter(models.Solicitud.estado == estado)
-    
-    total_records = count_query.scalar()
+
+    def contar_en_primario() -> int:
+        # La invalidación viene de escrituras en el primario: una réplica atrasada
+        # daría un total "exacto" viejo que quedaría cacheado TTL_SEGUNDOS
+        primario = database.SessionLocal()
+        try:
+            count_query = primario.query(func.count(models.Solicitud.id))
+            if estado:
+                count_query = count_query.filter(models.Solicitud.estado == estado)
+            return count_query.scalar()
+        finally:
+            primario.close()
+
+    # El COUNT(*) solo corre si el total cacheado fue invalidado por una escritura
+    total_records, total_is_estimate = conteos.contar(
+        db, models.Solicitud.__tablename__, estado, contar_en_primario
+    )
     total_pages = (total_records + limit - 1) // limit if total_records > 0 else 1
 
     data = get_base_query(db, estado).offset(offset).limit(limit).all()
@@ -132,17 +234,42 @@ def listar_solicitudes(
     return {
         "data": data,
         "total": total_records,
+        "total_is_estimate": total_is_estimate,
         "page": page,
         "limit": limit,
         "total_pages": total_pages
     }
 
+# ==============================================================================
+#                        IMPORTACIÓN MASIVA
+# ==============================================================================
+
+def formato_import(request: Request) -> str:
+    tipo = request.headers.get("content-type", "")
+    if "csv" in tipo:
+        return "csv"
+    if "ndjson" in tipo or "jsonl" in tipo or "json" in tipo:
+        return "ndjson"
+    raise HTTPException(status_code=415, detail="Usa Content-Type text/csv o application/x-ndjson")
+
+@router.post("/import/usuarios")
+async def import_usuarios(request: Request):
+    """Alta masiva de estudiantes. Columnas: nombre_completo, email, password."""
+    formato = formato_import(request)
+    return importacion.ImportResponse(importacion.importar_usuarios(request.stream(), formato), media_type="application/x-ndjson")
+
+@router.post("/import/solicitudes")
+async def import_solicitudes(request: Request):
+    """Alta masiva de solicitudes. Columnas de SolicitudCreate + email_estudiante."""
+    formato = formato_import(request)
+    return importacion.ImportResponse(importacion.importar_solicitudes(request.stream(), formato), media_type="application/x-ndjson")
+
 # ==============================================================================
 #                        4. EXPORTACIÓN ULTRARÁPIDA
 # ==============================================================================
 
 @router.get("/export/csv")
-def export_csv(estado: Optional[str] = None, db: Session = Depends(database.get_db)):
+def export_csv(estado: Optional[str] = None, db: Session = Depends(database.get_read_db)):
     """Exporta CSV leyendo tuplas crudas."""
     def iter_csv():
         output = io.StringIO()
@@ -183,7 +310,7 @@ def export_csv(estado: Optional[str] = None, db: Session = Depends(database.get_
     return response
 
 @router.get("/export/json")
-def export_json(estado: Optional[str] = None, db: Session = Depends(database.get_db)):
+def export_json(estado: Optional[str] = None, db: Session = Depends(database.get_read_db)):
     """Exporta JSON streaming desde tuplas."""
     def iter_json():
         yield "[\n"
@@ -219,7 +346,7 @@ def export_json(estado: Optional[str] = None, db: Session = Depends(database.get
     return response
 
 @router.get("/export/xml")
-def export_xml(estado: Optional[str] = None, db: Session = Depends(database.get_db)):
+def export_xml(estado: Optional[str] = None, db: Session = Depends(database.get_read_db)):
     """Exporta XML streaming desde tuplas."""
     def iter_xml():
         yield '<?xml version="1.0" encoding="UTF-8"?>\n<solicitudes>\n'
@@ -253,7 +380,7 @@ def export_xml(estado: Optional[str] = None, db: Session = Depends(database.get_
     return response
 
 @router.get("/export/pdf")
-def export_pdf(estado: Optional[str] = None, db: Session = Depends(database.get_db)):
+def export_pdf(estado: Optional[str] = None, db: Session = Depends(database.get_read_db)):
     """
     PDF: Usa la query rápida y limita a 1000 registros para ser robusto.
     """
@@ -1,50 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.orm import Session, joinedload
 from app.core import database
 from app.models import solicitudes as models, users
 from app.schemas import solicitudes as schemas
+from app.services.recomendaciones import motor, TOP_K
+from app.services import ofertas as ofertas_service
+from app.core.profiling import RutaPerfilada
+from typing import Optional
 
-router = APIRouter(prefix="/asesores", tags=["Asesores"])
+router = APIRouter(prefix="/asesores", tags=["Asesores"], route_class=RutaPerfilada)
 
 # 1. Ver Mercado
 @router.get("/mercado")
-def ver_mercado(db: Session = Depends(database.get_db)):
+def ver_mercado(db: Session = Depends(database.get_read_db)):
     return db.query(models.Solicitud).filter(models.Solicitud.estado == "Abierta").all()
 
 # 2. Crear Oferta
 @router.post("/ofertar")
-def crear_oferta(dto: schemas.OfertaCreate, email_user: str, db: Session = Depends(database.get_db)):
+def crear_oferta(
+    dto: schemas.OfertaCreate,
+    email_user: str,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(database.get_db)
+):
     asesor = db.query(users.Usuario).filter(users.Usuario.email == email_user).first()
     
-    if asesor.rol != "Asesor":
+    if not asesor or asesor.rol != "Asesor":
         raise HTTPException(status_code=403, detail="Solo los asesores pueden ofertar.")
 
-    existe = db.query(models.Oferta).filter(
-        models.Oferta.solicitud_id == dto.solicitud_id,
-        models.Oferta.asesor_id == asesor.id
-    ).first()
-    
-    if existe:
-        raise HTTPException(status_code=400, detail="Ya enviaste una oferta para esta solicitud.")
-
-    nueva_oferta = models.Oferta(
-        solicitud_id=dto.solicitud_id,
-        asesor_id=asesor.id,
-        # nombre_asesor lo omitimos al guardar porque no existe en la tabla
-        precio=dto.precio,
-        mensaje=dto.mensaje,
-        estado="Pendiente"
-    )
-    
-    db.add(nueva_oferta)
-    db.commit()
+    ofertas_service.enviar_oferta(db, asesor, dto.solicitud_id, dto.precio, dto.mensaje, idempotency_key)
     return {"mensaje": "Oferta enviada exitosamente"}
 
 # 3. Mis Ofertas (CORREGIDO)
 @router.get("/mis-ofertas", response_model=list[schemas.OfertaResponse])
 def mis_ofertas(email_user: str, db: Session = Depends(database.get_db)):
     asesor = db.query(users.Usuario).filter(users.Usuario.email == email_user).first()
-    ofertas = db.query(models.Oferta).filter(models.Oferta.asesor_id == asesor.id).all()
+    # Solicitud y estudiante vienen en el mismo JOIN (sin N+1)
+    ofertas = db.query(models.Oferta).options(
+        joinedload(models.Oferta.solicitud).joinedload(models.Solicitud.estudiante)
+    ).filter(models.Oferta.asesor_id == asesor.id).all()
 
     for of in ofertas:
         # A) RELLENAR NOMBRE (Corrección del Error)
@@ -53,10 +47,17 @@ def mis_ofertas(email_user: str, db: Session = Depends(database.get_db)):
 
         # B) LÓGICA DE CONTACTO
         if of.estado in ["Aceptada", "Finalizada"]:
-            solicitud = db.query(models.Solicitud).filter(models.Solicitud.id == of.solicitud_id).first()
-            if solicitud:
-                estudiante = db.query(users.Usuario).filter(users.Usuario.id == solicitud.estudiante_id).first()
-                if estudiante:
-                    of.contacto_match = estudiante.email
+            if of.solicitud and of.solicitud.estudiante:
+                of.contacto_match = of.solicitud.estudiante.email
+
+    return ofertas
+
+# 4. Recomendaciones (Top-K precalculado por asesor)
+@router.get("/recomendaciones", response_model=list[schemas.RecomendacionResponse])
+def recomendaciones(email_user: str, limit: int = Query(10, ge=1, le=TOP_K), db: Session = Depends(database.get_db)):
+    asesor = db.query(users.Usuario).filter(users.Usuario.email == email_user).first()
+    if not asesor or asesor.rol != "Asesor":
+        raise HTTPException(status_code=403, detail="Solo los asesores tienen recomendaciones.")
 
-    return ofertas
\ No newline at end of file
+    motor.asegurar_cargado(db)
+    return motor.top(asesor.id, limit)
@@ -3,9 +3,10 @@ from sqlalchemy.orm import Session
 from app.core import database, security
 from app.models.users import Usuario
 from app.schemas import auth as schemas
+from app.core.profiling import RutaPerfilada
 
 # Definimos el "Router" que actúa como controlador
-router = APIRouter(prefix="/auth", tags=["Autenticación"])
+router = APIRouter(prefix="/auth", tags=["Autenticación"], route_class=RutaPerfilada)
 
 @router.post("/register", response_model=schemas.UsuarioResponse)
 def register(usuario: schemas.UsuarioCreate, db: Session = Depends(database.get_db)):
@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from app.core import database
+from app.core.realtime import hub, CANAL_MERCADO, canal_asesor
 from app.models import solicitudes as models, users
+from app.services.recomendaciones import motor
+from app.services import eventos, conteos
 from app.schemas import solicitudes as schemas
+from app.core.profiling import RutaPerfilada
 
-router = APIRouter(prefix="/estudiantes", tags=["Estudiantes"])
+router = APIRouter(prefix="/estudiantes", tags=["Estudiantes"], route_class=RutaPerfilada)
 
 # 1. Crear Solicitud
 @router.post("/solicitudes", response_model=schemas.SolicitudResponse)
@@ -17,22 +21,30 @@ def crear_solicitud(dto: schemas.SolicitudCreate, email_user: str, db: Session =
     db.add(nueva_solicitud)
     db.commit()
     db.refresh(nueva_solicitud)
+
+    hub.publicar(CANAL_MERCADO, "solicitud_nueva", solicitud_id=nueva_solicitud.id,
+                 materia=nueva_solicitud.materia, tema=nueva_solicitud.tema)
+    motor.agregar_solicitud(nueva_solicitud)
+    eventos.registrar("Solicitud", nueva_solicitud.id, None, "Abierta", usuario.id)
+    conteos.invalidar("Solicitudes")
     return nueva_solicitud
 
 # 2. Ver Mis Solicitudes (CORREGIDO: Inyección de Nombres y Contacto)
 @router.get("/mis-solicitudes", response_model=list[schemas.SolicitudResponse])
 def mis_solicitudes(email_user: str, db: Session = Depends(database.get_db)):
     usuario = db.query(users.Usuario).filter(users.Usuario.email == email_user).first()
-    solicitudes = db.query(models.Solicitud).filter(models.Solicitud.estudiante_id == usuario.id).all()
+    # Ofertas y asesores en una sola consulta extra (sin N+1)
+    solicitudes = db.query(models.Solicitud).options(
+        selectinload(models.Solicitud.ofertas).joinedload(models.Oferta.asesor)
+    ).filter(models.Solicitud.estudiante_id == usuario.id).all()
     
     for sol in solicitudes:
         # A) RELLENAR NOMBRE DEL ASESOR EN LAS OFERTAS (Corrección del Error)
-        # Como la tabla Oferta ya no guarda el nombre, lo buscamos por el ID del asesor
+        # Como la tabla Oferta ya no guarda el nombre, lo tomamos del asesor ya cargado
         for oferta in sol.ofertas:
             if not hasattr(oferta, 'nombre_asesor') or not oferta.nombre_asesor:
-                asesor_data = db.query(users.Usuario).filter(users.Usuario.id == oferta.asesor_id).first()
-                if asesor_data:
-                    oferta.nombre_asesor = asesor_data.nombre_completo
+                if oferta.asesor:
+                    oferta.nombre_asesor = oferta.asesor.nombre_completo
                 else:
                     oferta.nombre_asesor = "Usuario Eliminado"
 
@@ -41,10 +53,8 @@ def mis_solicitudes(email_user: str, db: Session = Depends(database.get_db)):
             # Buscamos la oferta ganadora
             oferta_ganadora = next((o for o in sol.ofertas if o.estado in ["Aceptada", "Finalizada"]), None)
             
-            if oferta_ganadora:
-                asesor = db.query(users.Usuario).filter(users.Usuario.id == oferta_ganadora.asesor_id).first()
-                if asesor:
-                    sol.contacto_match = asesor.email
+            if oferta_ganadora and oferta_ganadora.asesor:
+                sol.contacto_match = oferta_ganadora.asesor.email
 
     return solicitudes
 
@@ -60,8 +70,15 @@ def cancelar_solicitud(solicitud_id: int, email_user: str, db: Session = Depends
     if not solicitud:
         raise HTTPException(status_code=404, detail="Solicitud no encontrada")
     
+    estado_previo = solicitud.estado
     solicitud.estado = "Cancelada"
     db.commit()
+
+    eventos.registrar("Solicitud", solicitud_id, estado_previo, "Cancelada", usuario.id)
+    conteos.invalidar("Solicitudes")
+
+    hub.publicar(CANAL_MERCADO, "solicitud_cerrada", solicitud_id=solicitud_id, estado="Cancelada")
+    motor.quitar_solicitud(solicitud_id)
     return {"mensaje": "Solicitud cancelada"}
 
 # 4. Editar Solicitud
@@ -87,6 +104,9 @@ def editar_solicitud(solicitud_id: int, dto: schemas.SolicitudCreate, email_user
     
     db.commit()
     db.refresh(solicitud)
+
+    # Cambió materia/tema: se vuelve a puntuar (conserva el conteo de ofertas)
+    motor.actualizar_solicitud(solicitud)
     return solicitud
 
 # 5. Solicitar ser Asesor (Postulación)
@@ -104,6 +124,8 @@ def crear_postulacion(dto: schemas.PostulacionCreate, email_user: str, db: Sessi
     db.add(nueva)
     db.commit()
     db.refresh(nueva)
+
+    eventos.registrar("PostulacionAsesor", nueva.id, None, "Pendiente", usuario.id)
     return nueva
 
 # 6. Aceptar Oferta (Match)
@@ -129,19 +151,34 @@ def aceptar_oferta(solicitud_id: int, oferta_id: int, email_user: str, db: Sessi
     if not oferta_seleccionada:
         raise HTTPException(status_code=404, detail="Oferta no encontrada")
 
-    # Match
-    solicitud.estado = "EnProceso"
-    oferta_seleccionada.estado = "Aceptada"
-    
     otras_ofertas = db.query(models.Oferta).filter(
         models.Oferta.solicitud_id == solicitud_id,
         models.Oferta.id != oferta_id
     ).all()
-    
+
+    # Capturamos ids y estados previos antes del commit (después los objetos quedan expirados)
+    deltas = [(oferta_seleccionada.asesor_id, oferta_id, oferta_seleccionada.estado, "Aceptada")]
+    deltas += [(of.asesor_id, of.id, of.estado, "Rechazada") for of in otras_ofertas]
+
+    # Match
+    solicitud.estado = "EnProceso"
+    oferta_seleccionada.estado = "Aceptada"
     for of in otras_ofertas:
         of.estado = "Rechazada"
 
     db.commit()
+
+    eventos.registrar("Solicitud", solicitud_id, "Abierta", "EnProceso", usuario.id)
+    conteos.invalidar("Solicitudes")
+    for _, of_id, previo, estado in deltas:
+        eventos.registrar("Oferta", of_id, previo, estado, usuario.id)
+
+    # Deltas: el mercado pierde la solicitud y cada asesor ve el estado de su oferta
+    hub.publicar(CANAL_MERCADO, "solicitud_cerrada", solicitud_id=solicitud_id, estado="EnProceso")
+    motor.quitar_solicitud(solicitud_id)
+    for asesor_id, of_id, _, estado in deltas:
+        hub.publicar(canal_asesor(asesor_id), "oferta_actualizada",
+                     solicitud_id=solicitud_id, oferta_id=of_id, estado=estado)
     return {"mensaje": "Oferta aceptada."}
 
 # 7. Finalizar Asesoría
@@ -168,6 +205,12 @@ def finalizar_solicitud(solicitud_id: int, email_user: str, db: Session = Depend
     
     if oferta_ganadora:
         oferta_ganadora.estado = "Finalizada"
+        oferta_ganadora_id = oferta_ganadora.id
     
     db.commit()
+
+    eventos.registrar("Solicitud", solicitud_id, "EnProceso", "Finalizada", usuario.id)
+    conteos.invalidar("Solicitudes")
+    if oferta_ganadora:
+        eventos.registrar("Oferta", oferta_ganadora_id, "Aceptada", "Finalizada", usuario.id)
     return {"mensaje": "Asesoría finalizada."}
\ No newline at end of file
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.core import database
 from app.models import solicitudes as models, users
 from app.schemas import solicitudes as schemas
+from app.services.analitica_precios import analitica
+from app.services import ofertas as ofertas_service
+from app.services import eventos
+from app.core.profiling import RutaPerfilada
+from typing import Optional
 
-router = APIRouter(prefix="/mercado", tags=["Mercado Asesores"])
+router = APIRouter(prefix="/mercado", tags=["Mercado Asesores"], route_class=RutaPerfilada)
 
 # 1. Postularse como Asesor
 @router.post("/postulacion", response_model=schemas.PostulacionResponse)
@@ -20,11 +25,13 @@ def postularse(dto: schemas.PostulacionCreate, email_user: str, db: Session = De
     db.add(nueva)
     db.commit()
     db.refresh(nueva)
+
+    eventos.registrar("PostulacionAsesor", nueva.id, None, nueva.estado, usuario.id)
     return nueva
 
 # 2. Ver Mercado (Solicitudes Abiertas de OTROS estudiantes)
 @router.get("/oportunidades", response_model=list[schemas.SolicitudResponse])
-def ver_oportunidades(materia: str = None, db: Session = Depends(database.get_db)):
+def ver_oportunidades(materia: str = None, db: Session = Depends(database.get_read_db)):
     query = db.query(models.Solicitud).filter(models.Solicitud.estado == "Abierta")
     
     if materia:
@@ -32,30 +39,32 @@ def ver_oportunidades(materia: str = None, db: Session = Depends(database.get_db
         
     return query.all()
 
-# 3. Enviar Oferta (Cotizar)
+# 3. Precios de referencia por materia (para saber si una cotización es justa)
+@router.get("/precios", response_model=list[schemas.PrecioMateriaResponse])
+def ver_precios(materia: str = None, dias: int = Query(30, ge=1, le=365), db: Session = Depends(database.get_db)):
+    return analitica.resumen(db, dias=dias, materia=materia)
+
+# 4. Enviar Oferta (Cotizar)
 @router.post("/solicitud/{solicitud_id}/ofertar", response_model=schemas.OfertaResponse)
-def enviar_oferta(solicitud_id: int, dto: schemas.OfertaCreate, email_asesor: str, db: Session = Depends(database.get_db)):
+def enviar_oferta(
+    solicitud_id: int,
+    dto: schemas.OfertaCreate,
+    email_asesor: str,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(database.get_db)
+):
     asesor = db.query(users.Usuario).filter(users.Usuario.email == email_asesor).first()
-    
-    # Validar que no se auto-oferte
-    solicitud = db.query(models.Solicitud).get(solicitud_id)
-    if solicitud.estudiante_id == asesor.id:
-        raise HTTPException(status_code=400, detail="No puedes ofertar en tu propia solicitud")
+    if not asesor:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    nueva_oferta = models.Oferta(
-        solicitud_id=solicitud_id,
-        asesor_id=asesor.id,
-        precio=dto.precio,
-        mensaje=dto.mensaje
+    nueva_oferta, _ = ofertas_service.enviar_oferta(
+        db, asesor, solicitud_id, dto.precio, dto.mensaje, idempotency_key
     )
     
-    db.add(nueva_oferta)
-    db.commit()
-    db.refresh(nueva_oferta)
-    
     # Mapeo manual para respuesta
     return {
         "id": nueva_oferta.id,
+        "solicitud_id": nueva_oferta.solicitud_id,
         "asesor_id": asesor.id,
         "nombre_asesor": asesor.nombre_completo,
         "precio": nueva_oferta.precio,
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import json
+
+from app.core import database
+from app.core.realtime import hub, CANAL_MERCADO, canal_estudiante, canal_asesor
+from app.models import users
+from app.core.profiling import RutaPerfilada
+
+router = APIRouter(prefix="/notificaciones", tags=["Tiempo Real"], route_class=RutaPerfilada)
+
+# Cada cuánto mandamos un ping si no hay eventos (mantiene viva la conexión)
+HEARTBEAT_SEGUNDOS = 25
+
+# ==============================================================================
+#                                HELPERS
+# ==============================================================================
+
+def resolver_canales(db: Session, email_user: Optional[str], mercado: bool) -> set:
+    """Canales a los que se suscribe el cliente según su rol."""
+    canales = set()
+    if mercado:
+        canales.add(CANAL_MERCADO)
+
+    if email_user:
+        usuario = db.query(users.Usuario).filter(users.Usuario.email == email_user).first()
+        if not usuario:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        canales.add(canal_estudiante(usuario.id))
+        if usuario.rol == "Asesor":
+            canales.add(canal_asesor(usuario.id))
+
+    if not canales:
+        raise HTTPException(status_code=400, detail="No hay canales a los que suscribirse")
+    return canales
+
+
+def canales_para(email_user: Optional[str], mercado: bool) -> set:
+    """Sesión corta solo para resolver canales (síncrona: llamar vía threadpool)."""
+    db = database.SessionLocal()
+    try:
+        return resolver_canales(db, email_user, mercado)
+    finally:
+        db.close()
+
+# ==============================================================================
+#                        1. WEBSOCKET
+# ==============================================================================
+@router.websocket("/ws")
+async def ws_eventos(
+    websocket: WebSocket,
+    email_user: Optional[str] = None,
+    mercado: bool = True,
+):
+    # La consulta es síncrona: corre en el threadpool para no bloquear el event loop
+    try:
+        canales = await run_in_threadpool(canales_para, email_user, mercado)
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=exc.detail)
+        return
+
+    await websocket.accept()
+    sub = hub.suscribir(canales)
+    try:
+        await websocket.send_json({"evento": "suscrito", "canales": sorted(canales)})
+        while True:
+            mensaje = await sub.siguiente(timeout=HEARTBEAT_SEGUNDOS)
+            await websocket.send_json(mensaje or {"evento": "ping"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.desuscribir(sub)
+
+# ==============================================================================
+#                        2. SERVER-SENT EVENTS
+# ==============================================================================
+@router.get("/sse")
+async def sse_eventos(
+    request: Request,
+    email_user: Optional[str] = None,
+    mercado: bool = Query(True),
+):
+    canales = await run_in_threadpool(canales_para, email_user, mercado)
+
+    sub = hub.suscribir(canales)
+
+    async def iter_eventos():
+        try:
+            yield f"event: suscrito\ndata: {json.dumps({'canales': sorted(canales)})}\n\n"
+            while not await request.is_disconnected():
+                mensaje = await sub.siguiente(timeout=HEARTBEAT_SEGUNDOS)
+                if mensaje is None:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {mensaje['evento']}\ndata: {json.dumps(mensaje)}\n\n"
+        finally:
+            hub.desuscribir(sub)
+
+    return StreamingResponse(
+        iter_eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,6 +1,11 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import os
+import threading
+import time
 import urllib.parse
 
 # --- TU CONFIGURACIÓN ---
@@ -18,14 +23,116 @@ params = urllib.parse.quote_plus(
     "TrustServerCertificate=yes;"
 )
 
-SQLALCHEMY_DATABASE_URL = f"mssql+pyodbc:///?odbc_connect={params}"
+# DATABASE_URL permite apuntar a otra BD sin tocar este archivo (ej. los scripts
+# de verificación de CI usan "sqlite://" y no necesitan pyodbc ni SQL Server)
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL") or f"mssql+pyodbc:///?odbc_connect={params}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# --- RÉPLICAS DE LECTURA (opcional) ---
+# URLs SQLAlchemy de las réplicas. Vacía = todas las lecturas van al primario.
+REPLICA_URLS = []
+# Cada cuánto se vuelve a verificar una réplica (segundos)
+REPLICA_HEALTHCHECK_SEGUNDOS = 30
+# Rutas de solo lectura que aun así deben leer del primario (ej. "/admin/solicitudes")
+RUTAS_PRIMARIO = set()
+# Header con el que un cliente pide leer del primario (read-your-writes tras escribir)
+HEADER_PRIMARIO = "x-read-primary"
+
+
+def crear_engine(url: str):
+    if url.startswith("sqlite"):
+        # SQLite (pruebas locales): la conexión se comparte entre hilos del threadpool
+        return create_engine(url, connect_args={"check_same_thread": False})
+    if url.startswith("mssql+pyodbc"):
+        # executemany en un solo round trip (importaciones masivas, log de eventos)
+        return create_engine(url, fast_executemany=True)
+    return create_engine(url)
+
+
+engine = crear_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+class Replica:
+    def __init__(self, url: str):
+        self.engine = crear_engine(url)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        # Hasta el primer health check las lecturas van al primario
+        self.sana = False
+        self.verificada_en = 0.0
+        self.verificando = False
+
+    def verificar(self) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            self.sana = True
+        except SQLAlchemyError:
+            self.sana = False
+        finally:
+            self.verificada_en = time.monotonic()
+            self.verificando = False
+        return self.sana
+
+
+class ReadRouter:
+    """Reparte las lecturas entre réplicas sanas (round-robin); si no hay, usa el primario."""
+
+    def __init__(self, urls):
+        self.replicas = [Replica(url) for url in urls]
+        self._siguiente = 0
+        self._lock = threading.Lock()
+
+    def _elegir(self):
+        # El lock solo protege el estado; el health check (red, puede tardar el
+        # timeout de conexión) corre en un hilo aparte, uno por réplica a la vez.
+        # Mientras tanto se usa el último estado conocido.
+        pendientes = []
+        elegida = None
+        with self._lock:
+            ahora = time.monotonic()
+            n = len(self.replicas)
+            for replica in self.replicas:
+                if not replica.verificando and ahora - replica.verificada_en > REPLICA_HEALTHCHECK_SEGUNDOS:
+                    replica.verificando = True
+                    pendientes.append(replica)
+            for i in range(n):
+                replica = self.replicas[(self._siguiente + i) % n]
+                if replica.sana:
+                    self._siguiente = (self._siguiente + i + 1) % n
+                    elegida = replica
+                    break
+        for replica in pendientes:
+            threading.Thread(target=replica.verificar, daemon=True, name="replica-healthcheck").start()
+        return elegida
+
+    def session(self):
+        replica = self._elegir() if self.replicas else None
+        return replica.SessionLocal() if replica else SessionLocal()
+
+    def estado(self):
+        return [{"url": r.engine.url.render_as_string(hide_password=True), "sana": r.sana} for r in self.replicas]
+
+
+read_router = ReadRouter(REPLICA_URLS)
+
+
 def get_db():
+    """Sesión contra el primario: escrituras y lecturas que necesitan lo recién escrito."""
     db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request):
+    """Sesión de solo lectura: va a una réplica salvo override por ruta o por header."""
+    route = request.scope.get("route")
+    if request.headers.get(HEADER_PRIMARIO) or (route is not None and route.path in RUTAS_PRIMARIO):
+        db = SessionLocal()
+    else:
+        db = read_router.session()
     try:
         yield db
     finally:
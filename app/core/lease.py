@@ -0,0 +1,50 @@
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.sistema import Lease
+
+# Identidad de este worker (host:pid)
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def adquirir_lease(db: Session, nombre: str, duracion_segundos: int, owner: str = OWNER) -> bool:
+    """
+    Intenta tomar (o renovar) el lease `nombre`. Un solo UPDATE condicional:
+    gana quien lo encuentre vencido o ya sea su dueño.
+    """
+    ahora = datetime.utcnow()
+    expira = ahora + timedelta(seconds=duracion_segundos)
+
+    result = db.execute(
+        update(Lease)
+        .where(Lease.nombre == nombre, or_(Lease.expira_en < ahora, Lease.owner == owner))
+        .values(owner=owner, expira_en=expira)
+    )
+    if result.rowcount == 1:
+        db.commit()
+        return True
+    db.rollback()
+
+    # Primera vez: la fila no existe. Si dos workers la insertan a la vez, uno falla.
+    if db.get(Lease, nombre) is None:
+        db.add(Lease(nombre=nombre, owner=owner, expira_en=expira))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+    return False
+
+
+def liberar_lease(db: Session, nombre: str, owner: str = OWNER):
+    db.execute(
+        update(Lease)
+        .where(Lease.nombre == nombre, Lease.owner == owner)
+        .values(expira_en=datetime.utcnow())
+    )
+    db.commit()
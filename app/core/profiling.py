@@ -0,0 +1,314 @@
+import functools
+import inspect
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from jose import JWTError, jwt
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import security
+
+# ==============================================================================
+#   PROFILING BAJO DEMANDA
+#   Un request se perfila si trae el header X-Profile con un token de Admin, o
+#   si cae en la muestra aleatoria SAMPLE_RATE. Un hilo muestrea las pilas de
+#   los hilos que trabajan para ese request y las sentencias SQL se anotan en
+#   la pila (hoja "[SQL] ..."). Se guardan los últimos MAX_PERFILES.
+#   Un hilo del threadpool cuenta solo mientras está marcado como trabajando
+#   para el request (endpoint sync o sentencia SQL); del hilo del event loop
+#   solo cuentan las muestras cuya pila pasa por la tarea del request.
+#   Sin header y con SAMPLE_RATE = 0 el middleware solo revisa un header.
+# ==============================================================================
+
+SAMPLE_RATE = 0.0
+INTERVALO_MUESTREO = 0.001   # segundos
+MAX_PERFILES = 20
+HEADER = b"x-profile"
+
+_perfil_actual: ContextVar[Optional["Perfil"]] = ContextVar("perfil_actual", default=None)
+_ids = itertools.count(1)
+perfiles: deque = deque(maxlen=MAX_PERFILES)
+
+# Funciones donde un hilo está esperando (no trabajando): esas muestras se descartan
+_FUNCIONES_OCIOSAS = {"wait", "select", "poll", "epoll", "_worker", "get", "sleep", "acquire"}
+
+
+class Perfil:
+    def __init__(self, metodo: str, path: str):
+        self.id = next(_ids)
+        self.metodo = metodo
+        self.path = path
+        self.inicio = datetime.utcnow()
+        self.duracion_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.muestras: Counter = Counter()
+        self.sql: List[dict] = []
+        # Hilo -> profundidad de trabajo en curso para este request (ver _trabajando)
+        self.activos: Counter = Counter()
+        self.sql_en_curso: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def entrar(self):
+        with self._lock:
+            self.activos[threading.get_ident()] += 1
+
+    def salir(self):
+        hilo = threading.get_ident()
+        with self._lock:
+            self.activos[hilo] -= 1
+            if self.activos[hilo] <= 0:
+                del self.activos[hilo]
+
+    def hilos_activos(self) -> set:
+        with self._lock:
+            return set(self.activos)
+
+    def resumen(self) -> dict:
+        return {
+            "id": self.id,
+            "metodo": self.metodo,
+            "path": self.path,
+            "inicio": self.inicio.isoformat(),
+            "duracion_ms": self.duracion_ms,
+            "status": self.status,
+            "muestras": sum(self.muestras.values()),
+            "sql_total": len(self.sql),
+            "sql_ms": round(sum(s["ms"] for s in self.sql), 2),
+        }
+
+
+# ==============================================================================
+#                        CORRELACIÓN CON SQL
+# ==============================================================================
+
+_listeners_instalados = False
+
+
+def _instalar_listeners():
+    global _listeners_instalados
+    if _listeners_instalados:
+        return
+    _listeners_instalados = True
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        perfil = _perfil_actual.get()
+        if perfil is not None:
+            perfil.entrar()
+            perfil.sql_en_curso[threading.get_ident()] = statement
+            conn.info.setdefault("perfil_t0", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        perfil = _perfil_actual.get()
+        if perfil is not None and conn.info.get("perfil_t0"):
+            ms = (time.perf_counter() - conn.info["perfil_t0"].pop()) * 1000
+            perfil.sql_en_curso.pop(threading.get_ident(), None)
+            perfil.salir()
+            perfil.sql.append({"sql": " ".join(statement.split()), "ms": round(ms, 3)})
+
+    @event.listens_for(Engine, "handle_error")
+    def _error(contexto):
+        # Una sentencia que falla (ej. el IntegrityError esperado de ofertas) no pasa
+        # por after_cursor_execute: sin esto el t0 quedaría en la conexión del pool
+        # y el hilo seguiría marcado con una sentencia que ya terminó
+        perfil = _perfil_actual.get()
+        conn = contexto.connection
+        if perfil is None or conn is None or not conn.info.get("perfil_t0"):
+            return
+        ms = (time.perf_counter() - conn.info["perfil_t0"].pop()) * 1000
+        perfil.sql_en_curso.pop(threading.get_ident(), None)
+        perfil.salir()
+        statement = contexto.statement or ""
+        perfil.sql.append({"sql": " ".join(statement.split()), "ms": round(ms, 3), "error": True})
+
+
+# ==============================================================================
+#                        ENDPOINTS SYNC (threadpool)
+# ==============================================================================
+
+def _trabajando(funcion):
+    """Marca el hilo del threadpool como ocupado por el request perfilado mientras corre."""
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        perfil = _perfil_actual.get()
+        if perfil is None:
+            return funcion(*args, **kwargs)
+        perfil.entrar()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            perfil.salir()
+    return envoltura
+
+
+class RutaPerfilada(APIRoute):
+    """route_class de los routers: envuelve los endpoints sync con _trabajando."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _trabajando(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+# ==============================================================================
+#                        MUESTREO
+# ==============================================================================
+
+def _pila(frame) -> List[str]:
+    pila = []
+    while frame is not None:
+        code = frame.f_code
+        pila.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+        frame = frame.f_back
+    pila.reverse()
+    return pila
+
+
+def _pasa_por(frame, objetivo) -> bool:
+    while frame is not None:
+        if frame is objetivo:
+            return True
+        frame = frame.f_back
+    return False
+
+
+class Muestreador(threading.Thread):
+    def __init__(self, perfil: Perfil, frame_tarea):
+        super().__init__(daemon=True, name=f"profiler-{perfil.id}")
+        self.perfil = perfil
+        # El event loop atiende a todos los requests: solo cuenta cuando ejecuta
+        # la tarea de este (su pila pasa por el frame del middleware)
+        self.hilo_loop = threading.get_ident()
+        self.frame_tarea = frame_tarea
+        self._parar = threading.Event()
+
+    def run(self):
+        propio = threading.get_ident()
+        while not self._parar.wait(INTERVALO_MUESTREO):
+            frames = sys._current_frames()
+            hilos = self.perfil.hilos_activos()
+            hilos.add(self.hilo_loop)
+            for hilo in hilos:
+                frame = frames.get(hilo)
+                if frame is None or hilo == propio or frame.f_code.co_name in _FUNCIONES_OCIOSAS:
+                    continue
+                if hilo == self.hilo_loop and not _pasa_por(frame, self.frame_tarea):
+                    continue
+                pila = _pila(frame)
+                sql = self.perfil.sql_en_curso.get(hilo)
+                if sql:
+                    pila.append("[SQL] " + " ".join(sql.split())[:120])
+                self.perfil.muestras[";".join(pila)] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        self.frame_tarea = None
+
+
+# ==============================================================================
+#                        EXPORTACIÓN
+# ==============================================================================
+
+def buscar(perfil_id: int) -> Optional[Perfil]:
+    return next((p for p in perfiles if p.id == perfil_id), None)
+
+
+def collapsed(perfil: Perfil) -> str:
+    """Formato 'frame;frame;frame N' (flamegraph.pl, speedscope, inferno)."""
+    return "\n".join(f"{pila} {n}" for pila, n in perfil.muestras.most_common()) + "\n"
+
+
+def speedscope(perfil: Perfil) -> dict:
+    frames: List[dict] = []
+    indices: Dict[str, int] = {}
+    samples, weights = [], []
+    for pila, n in perfil.muestras.items():
+        muestra = []
+        for nombre in pila.split(";"):
+            if nombre not in indices:
+                indices[nombre] = len(frames)
+                frames.append({"name": nombre})
+            muestra.append(indices[nombre])
+        samples.append(muestra)
+        weights.append(n * INTERVALO_MUESTREO * 1000)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{perfil.metodo} {perfil.path}",
+        "exporter": "lumina-profiler",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{perfil.metodo} {perfil.path} (#{perfil.id})",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+# ==============================================================================
+#                                MIDDLEWARE
+# ==============================================================================
+
+def _es_admin(headers) -> bool:
+    for nombre, valor in headers:
+        if nombre == b"authorization" and valor[:7].lower() == b"bearer ":
+            try:
+                payload = jwt.decode(valor[7:].decode(), security.SECRET_KEY, algorithms=[security.ALGORITHM])
+            except JWTError:
+                return False
+            return payload.get("rol") == "Admin"
+    return False
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def _activar(self, scope) -> bool:
+        if scope["type"] != "http":
+            return False
+        headers = scope["headers"]
+        if any(nombre == HEADER for nombre, _ in headers):
+            return _es_admin(headers)
+        return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if not self._activar(scope):
+            return await self.app(scope, receive, send)
+
+        _instalar_listeners()
+        perfil = Perfil(scope["method"], scope["path"])
+        token = _perfil_actual.set(perfil)
+        muestreador = Muestreador(perfil, sys._getframe())
+        inicio = time.perf_counter()
+
+        async def send_con_id(message):
+            if message["type"] == "http.response.start":
+                perfil.status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", str(perfil.id).encode())]
+            await send(message)
+
+        muestreador.start()
+        try:
+            await self.app(scope, receive, send_con_id)
+        finally:
+            muestreador.parar()
+            perfil.duracion_ms = round((time.perf_counter() - inicio) * 1000, 2)
+            _perfil_actual.reset(token)
+            perfiles.append(perfil)
@@ -0,0 +1,211 @@
+import json
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from jose import JWTError, jwt
+
+from app.core import security
+
+# ==============================================================================
+#   RATE LIMITING (TOKEN BUCKET)
+#   Middleware ASGI puro (sin BaseHTTPMiddleware) para que el costo por request
+#   sea de microsegundos. Cada regla tiene su propio bucket y un costo por
+#   request: las exportaciones gastan más tokens que una lectura normal.
+#
+#   Identidad del bucket: el `sub` del JWT si el request trae un bearer válido;
+#   si no, la IP del cliente. Detrás de un proxy/balanceador la IP que ve la app
+#   es la del proxy (todos compartirían bucket): arrancar uvicorn con
+#       --proxy-headers --forwarded-allow-ips="<IP del proxy>"
+#   para que tome la del X-Forwarded-For. Solo las IPs de proxies propios: con
+#   "*" cualquier cliente falsifica su IP con ese header y evade el límite.
+# ==============================================================================
+
+# None = buckets en memoria del proceso (1 worker).
+# Con varios workers apuntar a Redis, ej: "redis://localhost:6379/0"
+BACKEND_URL = None
+
+# Máximo de llaves en memoria antes de purgar buckets inactivos
+MAX_LLAVES = 100_000
+
+
+@dataclass(frozen=True)
+class Regla:
+    grupo: str              # Nombre del bucket (llave = grupo:identidad)
+    patron: Pattern
+    metodos: Tuple[str, ...]
+    capacidad: float        # Tokens máximos (ráfaga)
+    por_segundo: float      # Tokens que se recuperan por segundo
+    costo: float = 1.0      # Tokens que consume cada request
+    por_usuario: bool = False  # Sin JWT: llave = IP + usuario del query (solo rutas que lo usan)
+
+
+def regla(grupo, patron, capacidad, por_segundo, costo=1.0, metodos=("GET", "POST", "PUT", "DELETE"), por_usuario=False):
+    return Regla(grupo, re.compile(patron), tuple(metodos), capacidad, por_segundo, costo, por_usuario)
+
+
+# La primera regla que coincide gana; la última es el default
+REGLAS: List[Regla] = [
+    # Login: 5 intentos, 1 cada 12s por IP (protege CPU de bcrypt)
+    regla("login", r"^/auth/(login|register)$", capacidad=5, por_segundo=1 / 12, metodos=("POST",)),
+    # Exportaciones: cuestan 10 tokens, ráfaga de 3
+    regla("export", r"^/admin/export/", capacidad=30, por_segundo=0.5, costo=10),
+    # Importaciones masivas: pesadas, ráfaga de 3 y una cada 100s
+    regla("import", r"^/admin/import/", capacidad=30, por_segundo=0.1, costo=10, metodos=("POST",)),
+    # Ofertas: 10 por minuto por asesor (y por IP)
+    regla("ofertas", r"^/(asesores/ofertar|mercado/solicitud/\d+/ofertar)$", capacidad=10, por_segundo=1 / 6,
+          metodos=("POST",), por_usuario=True),
+    regla("general", r"", capacidad=120, por_segundo=2),
+]
+
+# Parámetros de query que identifican al usuario (el resto de la API no usa tokens).
+# No están autenticados: solo refinan la llave de IP en las reglas por_usuario,
+# nunca la reemplazan (si no, rotar ?email_user= saltaría cualquier límite).
+_PARAMS_USUARIO = (b"email_user=", b"email_asesor=")
+
+
+# ==============================================================================
+#                                BACKENDS
+# ==============================================================================
+
+class MemoryBackend:
+    """Buckets en un dict: llave -> [tokens, último_timestamp]."""
+
+    def __init__(self, max_llaves: int = MAX_LLAVES):
+        self._buckets: Dict[str, list] = {}
+        self._max_llaves = max_llaves
+
+    async def consumir(self, llave: str, r: Regla) -> Tuple[bool, float]:
+        ahora = time.monotonic()
+        bucket = self._buckets.get(llave)
+        if bucket is None:
+            if len(self._buckets) >= self._max_llaves:
+                self._purgar(ahora)
+            bucket = self._buckets[llave] = [r.capacidad, ahora]
+
+        tokens = min(r.capacidad, bucket[0] + (ahora - bucket[1]) * r.por_segundo)
+        bucket[1] = ahora
+        if tokens >= r.costo:
+            bucket[0] = tokens - r.costo
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (r.costo - tokens) / r.por_segundo
+
+    def _purgar(self, ahora: float):
+        # Un bucket inactivo por más de 1h ya estaría lleno: es equivalente a no tenerlo
+        viejas = [k for k, (_, ts) in self._buckets.items() if ahora - ts > 3600]
+        for k in viejas:
+            del self._buckets[k]
+        if len(self._buckets) >= self._max_llaves:
+            self._buckets.clear()
+
+
+class RedisBackend:
+    """Buckets compartidos entre workers. Requiere el paquete `redis`."""
+
+    _LUA = """
+    local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+    local cap, rate, costo, ahora = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local t = tonumber(b[1]) or cap
+    local ts = tonumber(b[2]) or ahora
+    t = math.min(cap, t + (ahora - ts) * rate)
+    local ok = 0
+    if t >= costo then t = t - costo; ok = 1 end
+    redis.call('HSET', KEYS[1], 't', t, 'ts', ahora)
+    redis.call('EXPIRE', KEYS[1], math.ceil(cap / rate) + 1)
+    return {ok, tostring(t)}
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as exc:
+            raise RuntimeError("BACKEND_URL apunta a Redis pero el paquete 'redis' no está instalado") from exc
+        self._redis = aioredis.from_url(url)
+        self._script = self._redis.register_script(self._LUA)
+
+    async def consumir(self, llave: str, r: Regla) -> Tuple[bool, float]:
+        ok, tokens = await self._script(
+            keys=[f"rl:{llave}"], args=[r.capacidad, r.por_segundo, r.costo, time.time()]
+        )
+        if ok:
+            return True, 0.0
+        return False, (r.costo - float(tokens)) / r.por_segundo
+
+
+def crear_backend(url: Optional[str] = BACKEND_URL):
+    if url and url.startswith("redis"):
+        return RedisBackend(url)
+    return MemoryBackend()
+
+
+# ==============================================================================
+#                                MIDDLEWARE
+# ==============================================================================
+
+def _usuario_autenticado(headers) -> Optional[str]:
+    """`sub` del bearer token si es válido; un token falso o vencido cuenta como anónimo."""
+    for nombre, valor in headers:
+        if nombre == b"authorization" and valor[:7].lower() == b"bearer ":
+            try:
+                payload = jwt.decode(valor[7:].decode(), security.SECRET_KEY, algorithms=[security.ALGORITHM])
+            except JWTError:
+                return None
+            return payload.get("sub")
+    return None
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, reglas: List[Regla] = None, backend=None):
+        self.app = app
+        self.reglas = reglas if reglas is not None else REGLAS
+        self.backend = backend or crear_backend()
+
+    def _regla(self, metodo: str, path: str) -> Optional[Regla]:
+        for r in self.reglas:
+            if metodo in r.metodos and r.patron.match(path):
+                return r
+        return None
+
+    @staticmethod
+    def _identidad(scope, r: Regla) -> str:
+        usuario = _usuario_autenticado(scope["headers"])
+        if usuario:
+            return f"jwt:{usuario}"
+        cliente = scope.get("client")
+        ip = cliente[0] if cliente else "anonimo"
+        query = scope.get("query_string", b"")
+        if r.por_usuario and query:
+            for param in _PARAMS_USUARIO:
+                i = query.find(param)
+                if i != -1 and (i == 0 or query[i - 1:i] == b"&"):
+                    fin = query.find(b"&", i)
+                    return f"{ip}:{query[i + len(param):fin if fin != -1 else None].decode('latin-1')}"
+        return ip
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        r = self._regla(scope["method"], scope["path"])
+        if r is None:
+            return await self.app(scope, receive, send)
+
+        permitido, espera = await self.backend.consumir(f"{r.grupo}:{self._identidad(scope, r)}", r)
+        if permitido:
+            return await self.app(scope, receive, send)
+
+        retry_after = str(max(1, math.ceil(espera)))
+        body = json.dumps({"detail": "Demasiadas solicitudes, intenta más tarde."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", retry_after.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
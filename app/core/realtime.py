@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+# ==============================================================================
+#   HUB PUB/SUB EN PROCESO
+#   Los endpoints de escritura publican deltas pequeños y los clientes suscritos
+#   (WebSocket / SSE) los reciben sin tener que re-consultar la BD en un loop.
+# ==============================================================================
+
+# Tamaño máximo de la cola de cada conexión (backpressure)
+QUEUE_MAXSIZE = 100
+
+# Canal global del mercado (nuevas solicitudes, cancelaciones, etc.)
+CANAL_MERCADO = "mercado"
+
+
+def canal_estudiante(estudiante_id: int) -> str:
+    return f"estudiante:{estudiante_id}"
+
+
+def canal_asesor(asesor_id: int) -> str:
+    return f"asesor:{asesor_id}"
+
+
+class Suscripcion:
+    """Conexión suscrita a uno o más canales, con cola acotada."""
+
+    def __init__(self, canales: Set[str], maxsize: int = QUEUE_MAXSIZE):
+        self.canales = canales
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.descartados = 0
+
+    def entregar(self, mensaje: dict):
+        """
+        Se ejecuta SIEMPRE dentro del event loop.
+        Si el cliente es lento y la cola se llena, se vacía y se deja un único
+        evento 'resync' para que el cliente vuelva a pedir el estado completo.
+        """
+        try:
+            self.queue.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            self.descartados += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"evento": "resync", "descartados": self.descartados})
+
+    async def siguiente(self, timeout: Optional[float] = None) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    def __init__(self):
+        self._subs: Dict[str, Set[Suscripcion]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def suscribir(self, canales: Set[str], maxsize: int = QUEUE_MAXSIZE) -> Suscripcion:
+        # Se llama desde el handler async, así que aquí conocemos el loop
+        self._loop = asyncio.get_running_loop()
+        sub = Suscripcion(canales, maxsize)
+        with self._lock:
+            for canal in canales:
+                self._subs.setdefault(canal, set()).add(sub)
+        return sub
+
+    def desuscribir(self, sub: Suscripcion):
+        with self._lock:
+            for canal in sub.canales:
+                subs = self._subs.get(canal)
+                if subs:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subs[canal]
+
+    def publicar(self, canal: str, evento: str, **datos):
+        """
+        Publica un delta en un canal. Es seguro llamarlo desde los endpoints
+        síncronos (threadpool): la entrega se agenda en el event loop.
+        Si nadie escucha el canal, no cuesta nada.
+        """
+        with self._lock:
+            subs = tuple(self._subs.get(canal, ()))
+        if not subs or self._loop is None or self._loop.is_closed():
+            return
+
+        mensaje = {"evento": evento, "canal": canal, "ts": datetime.utcnow().isoformat(), **datos}
+
+        def _entregar():
+            for sub in subs:
+                sub.entregar(mensaje)
+
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                _entregar()
+                return
+        except RuntimeError:
+            pass
+        self._loop.call_soon_threadsafe(_entregar)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {canal: len(subs) for canal, subs in self._subs.items()}
+
+
+hub = EventHub()
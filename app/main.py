@@ -1,16 +1,63 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import inspect
 from app.core.database import engine
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.services import vencimientos, eventos, recomendaciones
 # Importamos modelos para creación de tablas
-from app.models import users, solicitudes 
+from app.models import users, solicitudes, sistema
 # Importamos los controladores
-from app.controllers import auth_controller, estudiantes_controller, mercado_controller, admin_controller, asesores_controller
+from app.controllers import auth_controller, estudiantes_controller, mercado_controller, admin_controller, asesores_controller, notificaciones_controller
 
 # Crear tablas (Si borraste las anteriores, esto creará la nueva estructura completa)
 users.Base.metadata.create_all(bind=engine)
 solicitudes.Base.metadata.create_all(bind=engine)
+sistema.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Lumina Lite API - Full MVC")
+# create_all no agrega índices ni columnas a tablas que ya existían: de eso se
+# encarga la migración (python -m scripts.migrar_bd), que corre una vez por
+# despliegue y no desde cada worker. Aquí solo se verifica que esté aplicada.
+# Los índices únicos sostienen reglas de negocio (ej. una oferta por asesor y
+# solicitud, ya sin SELECT previo): si falta alguno, la app no arranca.
+_inspector = inspect(engine)
+for tabla in users.Base.metadata.sorted_tables:
+    en_bd = {i["name"] for i in _inspector.get_indexes(tabla.name)}
+    for indice in tabla.indexes:
+        if indice.name in en_bd:
+            continue
+        if indice.unique:
+            raise RuntimeError(
+                f"Falta el índice único {indice.name} en {tabla.name}. "
+                "Corre la migración: python -m scripts.migrar_bd"
+            )
+        logging.getLogger(__name__).warning(
+            "Falta el índice %s en %s (python -m scripts.migrar_bd)", indice.name, tabla.name
+        )
+
+# TAREAS DE FONDO (viven mientras vive la app)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tareas = [
+        asyncio.create_task(vencimientos.loop_vencimientos()),
+        asyncio.create_task(eventos.loop_flush()),
+        asyncio.create_task(recomendaciones.loop_reconstruccion()),
+    ]
+    yield
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+
+app = FastAPI(title="Lumina Lite API - Full MVC", lifespan=lifespan)
+
+# Profiling bajo demanda (el más interno: mide solo el trabajo del endpoint)
+app.add_middleware(ProfilingMiddleware)
+
+# Rate limiting (se registra antes que CORS para que los 429 lleven headers CORS)
+app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +73,7 @@ app.include_router(estudiantes_controller.router)
 app.include_router(mercado_controller.router)
 app.include_router(admin_controller.router)
 app.include_router(asesores_controller.router)
+app.include_router(notificaciones_controller.router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from app.core.database import Base
+
+# --- LEASE (candado distribuido para tareas de fondo con varios workers) ---
+class Lease(Base):
+    __tablename__ = "Leases"
+
+    nombre = Column(String(50), primary_key=True)     # Ej: 'vencimientos'
+    owner = Column(String(100), nullable=False)       # host:pid del worker que lo tiene
+    expira_en = Column(DateTime, nullable=False)
+
+
+# --- EVENTO DE ESTADO (log append-only de transiciones) ---
+class EventoEstado(Base):
+    __tablename__ = "EventosEstado"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entidad = Column(String(30), nullable=False)      # 'Solicitud', 'Oferta', 'PostulacionAsesor'
+    entidad_id = Column(Integer, nullable=False)
+    desde = Column(String(20), nullable=True)         # None = creación
+    hacia = Column(String(20), nullable=False)
+    actor_id = Column(Integer, nullable=True)         # None = sistema / admin
+    ts = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_eventos_entidad", "entidad", "entidad_id", "ts"),
+        Index("ix_eventos_hacia_ts", "entidad", "hacia", "ts"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Text, Index, text
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from app.models.mixins import AuditoriaMixin
@@ -17,13 +17,23 @@ class Solicitud(Base, AuditoriaMixin):
     fecha_limite = Column(DateTime, nullable=True)    # Para cuándo lo necesita
     archivo_url = Column(String(255), nullable=True)  # Link a Drive/Dropbox
     
-    # Estado del flujo: 'Abierta', 'EnProceso', 'Finalizada', 'Cancelada'
+    # Estado del flujo: 'Abierta', 'EnProceso', 'Finalizada', 'Cancelada', 'Vencida'
     estado = Column(String(20), default="Abierta")
 
     # Relaciones
     estudiante = relationship("app.models.users.Usuario", back_populates="solicitudes")
     ofertas = relationship("Oferta", back_populates="solicitud")
 
+    # Índices de las rutas calientes (los vigila scripts/query_plans.py)
+    __table_args__ = (
+        Index("ix_solicitudes_created", "created_at"),                  # listado admin sin filtro
+        Index("ix_solicitudes_estado_created", "estado", "created_at"), # listado/export por estado
+        Index("ix_solicitudes_estado_materia", "estado", "materia"),    # mercado
+        Index("ix_solicitudes_estado_limite", "estado", "fecha_limite"),# vencimientos
+        Index("ix_solicitudes_estudiante", "estudiante_id"),            # mis-solicitudes
+        Index("ix_solicitudes_modified", "modified_at"),                # sync de analítica (materia)
+    )
+
 
 # --- 2. OFERTA (La cotización del asesor) ---
 class Oferta(Base, AuditoriaMixin):
@@ -39,10 +49,27 @@ class Oferta(Base, AuditoriaMixin):
     # Estado de la oferta: 'Pendiente', 'Aceptada', 'Rechazada'
     estado = Column(String(20), default="Pendiente")
 
+    # Idempotency-Key con que se creó (y huella del request): un reintento en
+    # cualquier worker, o tras un reinicio, encuentra aquí la oferta original
+    idempotency_key = Column(String(100), nullable=True)
+    idempotency_huella = Column(String(64), nullable=True)
+
     # Relaciones
     solicitud = relationship("Solicitud", back_populates="ofertas")
     asesor = relationship("app.models.users.Usuario")
 
+    # Un asesor solo puede ofertar una vez por solicitud (lo garantiza la BD, no un SELECT)
+    __table_args__ = (
+        Index("ux_ofertas_solicitud_asesor", "solicitud_id", "asesor_id", unique=True),
+        # Filtrado: SQL Server trata los NULL como iguales en un índice único
+        Index("ux_ofertas_idempotencia", "asesor_id", "idempotency_key", unique=True,
+              mssql_where=text("idempotency_key IS NOT NULL"),
+              sqlite_where=text("idempotency_key IS NOT NULL")),
+        Index("ix_ofertas_asesor", "asesor_id"),                        # mis-ofertas
+        Index("ix_ofertas_modified", "modified_at"),                    # sync de analítica
+        Index("ix_ofertas_created", "created_at"),                      # sync de analítica (commits tardíos)
+    )
+
 
 # --- 3. POSTULACIÓN (Para ser asesor) ---
 class PostulacionAsesor(Base, AuditoriaMixin):
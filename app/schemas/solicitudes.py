@@ -65,6 +65,28 @@ class PostulacionResponse(PostulacionCreate):
 class PaginatedSolicitudesResponse(BaseModel):
     data: List[SolicitudResponse]
     total: int
+    total_is_estimate: bool = False   # True = tomado de caché invalidado o del catálogo
     page: int
     limit: int
-    total_pages: int
\ No newline at end of file
+    total_pages: int
+
+# --- RECOMENDACIONES ---
+class RecomendacionResponse(BaseModel):
+    solicitud_id: int
+    materia: str
+    tema: str
+    fecha_limite: Optional[datetime] = None
+    ofertas: int
+    score: float
+
+# --- ANALÍTICA DE PRECIOS ---
+class PrecioMateriaResponse(BaseModel):
+    materia: str
+    ofertas: int
+    precio_promedio: float
+    p25: float
+    p50: float
+    p75: float
+    p90: float
+    tasa_aceptacion: float               # ofertas aceptadas / ofertas
+    horas_primera_oferta: Optional[float] = None  # mediana
@@ -0,0 +1,235 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models import solicitudes as models
+
+# ==============================================================================
+#   ANALÍTICA DE PRECIOS SOBRE OFERTAS
+#   Las ofertas se guardan como columnas NumPy (no objetos ORM). La carga es
+#   incremental: se leen las ofertas nuevas (id > último visto, más las creadas
+#   desde la última sincronización: un id menor puede commitearse después), las
+#   que cambiaron de estado y las solicitudes a las que les cambió la materia.
+# ==============================================================================
+
+# Segundos entre refrescos contra la BD (y vida del caché de resultados)
+TTL_CACHE = 60
+
+# Tamaño de lote al leer ofertas nuevas (keyset por id)
+BATCH_SIZE = 5000
+
+# Las marcas de tiempo las pone la app al crear el objeto, no la BD al hacer
+# commit: se relee este margen hacia atrás (transacciones largas, relojes de
+# distintos servidores). Lo releído se deduplica por id.
+MARGEN_SYNC = 300  # segundos
+
+ESTADOS_ACEPTADOS = ("Aceptada", "Finalizada")
+PERCENTILES = (25, 50, 75, 90)
+
+
+class AnaliticaPrecios:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Columnas (ordenadas por oferta id)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.solicitud_ids = np.empty(0, dtype=np.int64)
+        self.materias = np.empty(0, dtype=np.int32)
+        self.precios = np.empty(0, dtype=np.float64)
+        self.aceptadas = np.empty(0, dtype=bool)
+        self.oferta_ts = np.empty(0, dtype="datetime64[s]")
+        self.solicitud_ts = np.empty(0, dtype="datetime64[s]")
+        # Posición de la primera oferta (de todo lo cargado) de cada solicitud
+        self.primeras = np.empty(0, dtype=np.int64)
+        # Diccionario materia -> código entero (para agrupar con NumPy)
+        self._nombres: List[str] = []
+        self._codigos: Dict[str, int] = {}
+        self._ultima_sync: Optional[datetime] = None
+        self._refrescado_en: Optional[float] = None
+        self._cache: Dict[Tuple[int, Optional[str]], List[dict]] = {}
+
+    # ------------------------------------------------------------------ carga
+    def _codigo(self, materia: str) -> int:
+        codigo = self._codigos.get(materia)
+        if codigo is None:
+            codigo = self._codigos[materia] = len(self._nombres)
+            self._nombres.append(materia)
+        return codigo
+
+    def _columnas_oferta(self, db: Session):
+        return (
+            db.query(
+                models.Oferta.id,
+                models.Oferta.solicitud_id,
+                models.Solicitud.materia,
+                models.Oferta.precio,
+                models.Oferta.estado,
+                models.Oferta.created_at,
+                models.Solicitud.created_at,
+            )
+            .join(models.Solicitud, models.Solicitud.id == models.Oferta.solicitud_id)
+        )
+
+    def _agregar(self, rows):
+        """Agrega filas (id, solicitud_id, materia, precio, estado, ts, ts) manteniendo el orden por id."""
+        ids, sol_ids, materias, precios, estados, of_ts, sol_ts = zip(*rows)
+        ids = np.asarray(ids, dtype=np.int64)
+        nuevas = ~np.isin(ids, self.ids)
+        if not nuevas.any():
+            return False
+        desordenado = self.ids.size and ids[nuevas].min() < self.ids[-1]
+        self.ids = np.concatenate([self.ids, ids[nuevas]])
+        self.solicitud_ids = np.concatenate([self.solicitud_ids, np.asarray(sol_ids, dtype=np.int64)[nuevas]])
+        self.materias = np.concatenate([self.materias, np.fromiter((self._codigo(m) for m in materias), dtype=np.int32, count=len(rows))[nuevas]])
+        self.precios = np.concatenate([self.precios, np.asarray(precios, dtype=np.float64)[nuevas]])
+        self.aceptadas = np.concatenate([self.aceptadas, np.isin(np.asarray(estados, dtype=object), ESTADOS_ACEPTADOS)[nuevas]])
+        self.oferta_ts = np.concatenate([self.oferta_ts, np.asarray(of_ts, dtype="datetime64[s]")[nuevas]])
+        self.solicitud_ts = np.concatenate([self.solicitud_ts, np.asarray(sol_ts, dtype="datetime64[s]")[nuevas]])
+        if desordenado:
+            # Llegó un id menor commiteado tarde: se reordena para que searchsorted siga valiendo
+            orden = np.argsort(self.ids, kind="stable")
+            for nombre in ("ids", "solicitud_ids", "materias", "precios", "aceptadas", "oferta_ts", "solicitud_ts"):
+                setattr(self, nombre, getattr(self, nombre)[orden])
+        return True
+
+    def refrescar(self, db: Session):
+        """Trae ofertas nuevas en lotes y actualiza el estado de las modificadas."""
+        inicio_sync = datetime.utcnow()
+        max_id = int(self.ids[-1]) if self.ids.size else 0
+        desde_sync = self._ultima_sync - timedelta(seconds=MARGEN_SYNC) if self._ultima_sync else None
+
+        # 1. Ofertas nuevas (keyset pagination, solo columnas)
+        nuevas = False
+        ultimo = max_id
+        while True:
+            rows = (
+                self._columnas_oferta(db)
+                .filter(models.Oferta.id > ultimo)
+                .order_by(models.Oferta.id)
+                .limit(BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            nuevas |= self._agregar(rows)
+            ultimo = rows[-1][0]
+
+        # 1b. Ofertas con id ya rebasado que se commitearon después de la última sync
+        if desde_sync is not None:
+            tardias = (
+                self._columnas_oferta(db)
+                .filter(models.Oferta.created_at >= desde_sync, models.Oferta.id <= max_id)
+                .all()
+            )
+            if tardias:
+                nuevas |= self._agregar(tardias)
+
+        # 2. Cambios de estado en ofertas ya cargadas
+        if desde_sync is not None:
+            modificadas = (
+                db.query(models.Oferta.id, models.Oferta.estado)
+                .filter(models.Oferta.modified_at >= desde_sync)
+                .all()
+            )
+            if modificadas:
+                mod_ids = np.asarray([r[0] for r in modificadas], dtype=np.int64)
+                mod_ok = np.isin(np.asarray([r[1] for r in modificadas], dtype=object), ESTADOS_ACEPTADOS)
+                pos = np.searchsorted(self.ids, mod_ids)
+                presentes = (pos < self.ids.size) & (self.ids[np.minimum(pos, self.ids.size - 1)] == mod_ids)
+                self.aceptadas[pos[presentes]] = mod_ok[presentes]
+
+            # 3. Solicitudes editadas: su materia nueva aplica a todas sus ofertas
+            editadas = (
+                db.query(models.Solicitud.id, models.Solicitud.materia)
+                .filter(models.Solicitud.modified_at >= desde_sync)
+                .all()
+            )
+            if editadas and self.ids.size:
+                sol_ids = np.asarray([r[0] for r in editadas], dtype=np.int64)
+                codigos = np.asarray([self._codigo(r[1]) for r in editadas], dtype=np.int32)
+                orden = np.argsort(sol_ids)
+                sol_ids, codigos = sol_ids[orden], codigos[orden]
+                pos = np.searchsorted(sol_ids, self.solicitud_ids)
+                afectadas = (pos < sol_ids.size) & (sol_ids[np.minimum(pos, sol_ids.size - 1)] == self.solicitud_ids)
+                self.materias[afectadas] = codigos[pos[afectadas]]
+
+        # Primera oferta de cada solicitud sobre todas las ofertas cargadas (no
+        # solo las de la ventana): se recalcula al traer ofertas nuevas
+        if nuevas:
+            orden_sol = np.lexsort((self.oferta_ts, self.solicitud_ids))
+            _, idx = np.unique(self.solicitud_ids[orden_sol], return_index=True)
+            self.primeras = orden_sol[idx]
+
+        self._ultima_sync = inicio_sync
+        self._refrescado_en = time.monotonic()
+        # La ventana de tiempo se mueve aunque no haya cambios: el caché vive un TTL
+        self._cache.clear()
+
+    # --------------------------------------------------------------- cálculo
+    def _calcular(self, dias: int, materia: Optional[str]) -> List[dict]:
+        desde = np.datetime64(datetime.utcnow() - timedelta(days=dias), "s")
+        mask = self.oferta_ts >= desde
+        if materia is not None:
+            codigo = self._codigos.get(materia)
+            if codigo is None:
+                return []
+            mask &= self.materias == codigo
+        if not mask.any():
+            return []
+
+        codigos = self.materias[mask]
+        precios = self.precios[mask]
+        aceptadas = self.aceptadas[mask]
+
+        # Agrupación por materia: ordenamos por (materia, precio) y partimos en bloques
+        orden = np.lexsort((precios, codigos))
+        codigos_ord = codigos[orden]
+        cortes = np.flatnonzero(np.diff(codigos_ord)) + 1
+        inicios = np.concatenate(([0], cortes))
+        grupos = codigos_ord[inicios]
+        conteos = np.diff(np.concatenate((inicios, [codigos_ord.size])))
+        precios_ord = precios[orden]
+        sumas = np.add.reduceat(precios_ord, inicios)
+        aceptadas_por_grupo = np.add.reduceat(aceptadas[orden].astype(np.int64), inicios)
+
+        # Tiempo a la primera oferta: la primera oferta real de cada solicitud,
+        # contada si cayó dentro de la ventana (no la primera de la ventana)
+        primeras = self.primeras[self.oferta_ts[self.primeras] >= desde]
+        if materia is not None:
+            primeras = primeras[self.materias[primeras] == codigo]
+        horas = (self.oferta_ts[primeras] - self.solicitud_ts[primeras]).astype(np.float64) / 3600.0
+        codigos_primeras = self.materias[primeras]
+
+        resultado = []
+        for i, codigo in enumerate(grupos):
+            bloque = precios_ord[inicios[i]:inicios[i] + conteos[i]]
+            pct = np.percentile(bloque, PERCENTILES)
+            horas_materia = horas[codigos_primeras == codigo]
+            resultado.append({
+                "materia": self._nombres[codigo],
+                "ofertas": int(conteos[i]),
+                "precio_promedio": round(float(sumas[i] / conteos[i]), 2),
+                "p25": round(float(pct[0]), 2),
+                "p50": round(float(pct[1]), 2),
+                "p75": round(float(pct[2]), 2),
+                "p90": round(float(pct[3]), 2),
+                "tasa_aceptacion": round(float(aceptadas_por_grupo[i] / conteos[i]), 4),
+                "horas_primera_oferta": round(float(np.median(horas_materia)), 2) if horas_materia.size else None,
+            })
+        return sorted(resultado, key=lambda r: r["ofertas"], reverse=True)
+
+    # ---------------------------------------------------------------- lectura
+    def resumen(self, db: Session, dias: int = 30, materia: Optional[str] = None, forzar: bool = False) -> List[dict]:
+        with self._lock:
+            if forzar or self._refrescado_en is None or time.monotonic() - self._refrescado_en > TTL_CACHE:
+                self.refrescar(db)
+            clave = (dias, materia)
+            if clave not in self._cache:
+                self._cache[clave] = self._calcular(dias, materia)
+            return self._cache[clave]
+
+
+analitica = AnaliticaPrecios()
@@ -0,0 +1,95 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+# ==============================================================================
+#   CONTEOS CACHEADOS PARA LISTADOS PAGINADOS
+#   El total de cada filtro se guarda en memoria y se invalida cuando hay
+#   escrituras en la tabla. En tablas grandes, si el valor quedó invalidado, se
+#   devuelve el último conocido (o el de las estadísticas del catálogo) marcado
+#   como estimado, en lugar de pagar un COUNT(*) en cada cambio de página.
+# ==============================================================================
+
+# Vida máxima de un conteo exacto (cubre escrituras hechas por otros workers)
+TTL_SEGUNDOS = 60
+# A partir de cuántas filas se aceptan estimados
+UMBRAL_ESTIMADO = 100_000
+# Vida máxima de un conteo invalidado que se sigue sirviendo como estimado
+TTL_ESTIMADO = 600
+# Cada cuánto se relee el tamaño de la tabla desde el catálogo
+TTL_CATALOGO = 300
+
+_lock = threading.Lock()
+# (tabla, filtro) -> (total, versión de la tabla, timestamp)
+_cache: Dict[Tuple[str, Optional[str]], Tuple[int, int, float]] = {}
+_versiones: Dict[str, int] = {}
+# tabla -> (filas según catálogo, timestamp)
+_catalogo: Dict[str, Tuple[Optional[int], float]] = {}
+
+
+def invalidar(tabla: str):
+    """Llamar después de un commit que inserta o cambia el estado de filas de `tabla`."""
+    with _lock:
+        _versiones[tabla] = _versiones.get(tabla, 0) + 1
+
+
+def filas_catalogo(db: Session, tabla: str) -> Optional[int]:
+    """Filas aproximadas según las estadísticas del motor (sin escanear la tabla)."""
+    ahora = time.monotonic()
+    cacheado = _catalogo.get(tabla)
+    if cacheado and ahora - cacheado[1] < TTL_CATALOGO:
+        return cacheado[0]
+
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mssql":
+        sql = "SELECT SUM(p.rows) FROM sys.partitions p WHERE p.object_id = OBJECT_ID(:t) AND p.index_id IN (0, 1)"
+    elif dialecto == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = :t"
+    else:
+        sql = None
+
+    filas = None
+    if sql:
+        try:
+            valor = db.execute(text(sql), {"t": tabla}).scalar()
+            filas = int(valor) if valor is not None and valor >= 0 else None
+        except SQLAlchemyError:
+            # Sin permisos sobre el catálogo: siempre conteo exacto
+            db.rollback()
+    _catalogo[tabla] = (filas, ahora)
+    return filas
+
+
+def contar(db: Session, tabla: str, filtro: Optional[str], contar_exacto: Callable[[], int]) -> Tuple[int, bool]:
+    """
+    Regresa (total, es_estimado).
+    `filtro` identifica la variante del conteo (ej. el estado); `contar_exacto`
+    ejecuta el COUNT(*) real solo cuando hace falta.
+    """
+    clave = (tabla, filtro)
+    ahora = time.monotonic()
+    with _lock:
+        version = _versiones.get(tabla, 0)
+        cacheado = _cache.get(clave)
+
+    if cacheado:
+        total, version_cache, ts = cacheado
+        if version_cache == version and ahora - ts < TTL_SEGUNDOS:
+            return total, False
+
+    filas = filas_catalogo(db, tabla)
+    if filas is not None and filas >= UMBRAL_ESTIMADO:
+        if cacheado and ahora - cacheado[2] < TTL_ESTIMADO:
+            # Tabla grande: el último conocido es buen estimado
+            return cacheado[0], True
+        if filtro is None:
+            return filas, True
+
+    total = contar_exacto()
+    with _lock:
+        _cache[clave] = (total, version, ahora)
+    return total, False
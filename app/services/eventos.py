@@ -0,0 +1,180 @@
+import asyncio
+import logging
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core import database
+from app.models.sistema import EventoEstado
+
+# ==============================================================================
+#   LOG DE TRANSICIONES DE ESTADO
+#   Los endpoints solo hacen un append a un ring buffer en memoria; una tarea de
+#   fondo lo vacía a la tabla EventosEstado con un INSERT masivo. Así el request
+#   no paga un round trip extra. Sobre el log se reconstruyen funnels y tiempos.
+# ==============================================================================
+
+BUFFER_MAX = 50_000
+FLUSH_SEGUNDOS = 1.0
+FLUSH_LOTE = 1000
+
+logger = logging.getLogger(__name__)
+
+_buffer: deque = deque(maxlen=BUFFER_MAX)
+
+metricas = {"registrados": 0, "escritos": 0, "descartados": 0, "errores": 0}
+
+
+def registrar(entidad: str, entidad_id: int, desde: Optional[str], hacia: str, actor_id: Optional[int] = None):
+    """Registra una transición. O(1) y sin tocar la BD."""
+    if desde == hacia:
+        return
+    if len(_buffer) == _buffer.maxlen:
+        # Ring buffer lleno (BD caída mucho tiempo): se pierde el evento más viejo
+        metricas["descartados"] += 1
+    _buffer.append({
+        "entidad": entidad,
+        "entidad_id": entidad_id,
+        "desde": desde,
+        "hacia": hacia,
+        "actor_id": actor_id,
+        "ts": datetime.utcnow(),
+    })
+    metricas["registrados"] += 1
+
+
+def flush() -> int:
+    """Escribe lo acumulado en lotes de FLUSH_LOTE (executemany)."""
+    escritos = 0
+    while _buffer:
+        lote = []
+        while _buffer and len(lote) < FLUSH_LOTE:
+            lote.append(_buffer.popleft())
+        try:
+            db = database.SessionLocal()
+            try:
+                db.execute(insert(EventoEstado), lote)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        except Exception:
+            # Se devuelven al frente para reintentar en el siguiente ciclo
+            _buffer.extendleft(reversed(lote))
+            raise
+        escritos += len(lote)
+    metricas["escritos"] += escritos
+    return escritos
+
+
+async def loop_flush(intervalo: float = FLUSH_SEGUNDOS):
+    try:
+        while True:
+            await asyncio.sleep(intervalo)
+            if _buffer:
+                try:
+                    await asyncio.to_thread(flush)
+                except Exception:
+                    # Cualquier falla (BD, driver, datos): se cuenta y el loop sigue vivo
+                    metricas["errores"] += 1
+                    logger.exception("No se pudo escribir el log de eventos")
+    finally:
+        # Al apagar la app, vaciamos lo pendiente
+        if _buffer:
+            try:
+                flush()
+            except Exception:
+                logger.exception("Se perdieron %s eventos al apagar", len(_buffer))
+
+
+# ==============================================================================
+#                        REPLAY Y ROLLUPS
+# ==============================================================================
+
+def replay(
+    db: Session,
+    entidad: str,
+    hasta: Optional[datetime] = None,
+    batch_size: int = 5000,
+    desde: Optional[datetime] = None,
+) -> Iterator[EventoEstado]:
+    """Recorre el log de una entidad en orden (entidad_id, ts), en lotes por keyset."""
+    query = db.query(
+        EventoEstado.id, EventoEstado.entidad_id, EventoEstado.desde,
+        EventoEstado.hacia, EventoEstado.actor_id, EventoEstado.ts
+    ).filter(EventoEstado.entidad == entidad)
+    if desde:
+        query = query.filter(EventoEstado.ts >= desde)
+    if hasta:
+        query = query.filter(EventoEstado.ts <= hasta)
+
+    ultimo = (0, 0)
+    while True:
+        rows = (
+            query.filter(
+                (EventoEstado.entidad_id > ultimo[0])
+                | ((EventoEstado.entidad_id == ultimo[0]) & (EventoEstado.id > ultimo[1]))
+            )
+            .order_by(EventoEstado.entidad_id, EventoEstado.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        yield from rows
+        ultimo = (rows[-1].entidad_id, rows[-1].id)
+
+
+def estados_en(db: Session, entidad: str, hasta: Optional[datetime] = None) -> Dict[int, str]:
+    """Reconstruye el estado de cada entidad en un instante dado."""
+    estados = {}
+    for ev in replay(db, entidad, hasta):
+        estados[ev.entidad_id] = ev.hacia
+    return estados
+
+
+def funnel(db: Session, entidad: str, dias: int = 30) -> Dict[str, int]:
+    """Cuántas entidades creadas en la ventana llegaron a cada estado."""
+    desde_ts = datetime.utcnow() - timedelta(days=dias)
+    alcanzados = defaultdict(set)
+    creadas = set()
+    # Todo evento de una entidad creada en la ventana es posterior a su creación:
+    # basta leer el log desde desde_ts, no completo
+    for ev in replay(db, entidad, desde=desde_ts):
+        if ev.desde is None and ev.ts >= desde_ts:
+            creadas.add(ev.entidad_id)
+        if ev.entidad_id in creadas:
+            alcanzados[ev.hacia].add(ev.entidad_id)
+    return {estado: len(ids) for estado, ids in alcanzados.items()}
+
+
+def tiempo_en_estado(db: Session, entidad: str) -> Dict[str, dict]:
+    """Horas promedio y máximas que las entidades pasan en cada estado (transiciones cerradas)."""
+    acumulado = defaultdict(lambda: [0, 0.0, 0.0])  # estado -> [n, suma_h, max_h]
+    previo = None
+    for ev in replay(db, entidad):
+        if previo is not None and previo.entidad_id == ev.entidad_id:
+            horas = (ev.ts - previo.ts).total_seconds() / 3600
+            item = acumulado[previo.hacia]
+            item[0] += 1
+            item[1] += horas
+            item[2] = max(item[2], horas)
+        previo = ev
+    return {
+        estado: {"transiciones": n, "horas_promedio": round(suma / n, 2), "horas_max": round(maximo, 2)}
+        for estado, (n, suma, maximo) in acumulado.items()
+    }
+
+
+def historial(db: Session, entidad: str, entidad_id: int):
+    return (
+        db.query(EventoEstado)
+        .filter(EventoEstado.entidad == entidad, EventoEstado.entidad_id == entidad_id)
+        .order_by(EventoEstado.ts, EventoEstado.id)
+        .all()
+    )
@@ -0,0 +1,301 @@
+import asyncio
+import codecs
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from app.core import database, security
+from app.core.realtime import hub, CANAL_MERCADO
+from app.models import solicitudes as models, users
+from app.schemas import auth as auth_schemas, solicitudes as schemas
+from app.services import eventos, conteos
+from app.services.recomendaciones import motor
+
+# ==============================================================================
+#   IMPORTACIÓN MASIVA (usuarios y solicitudes)
+#   El cuerpo del request se lee en streaming (CSV con encabezado o NDJSON) y se
+#   procesa por lotes: validación con los schemas de Pydantic, un SELECT ... IN
+#   por lote para los correos, hashing bcrypt repartido entre núcleos y un
+#   INSERT executemany por lote. Los errores por fila salen en la respuesta
+#   (NDJSON) mientras el archivo se sigue procesando.
+#
+#   CSV: una fila por línea (sin saltos de línea dentro de campos); para textos
+#   multilínea usar NDJSON.
+# ==============================================================================
+
+BATCH_SIZE = 500
+HASH_WORKERS = os.cpu_count() or 1
+
+# bcrypt libera el GIL mientras calcula el hash: un pool de hilos ya usa todos
+# los núcleos, sin el costo (ni los riesgos con hilos vivos) de hacer fork.
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _hash_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _pool
+
+
+def _hash_lote(passwords: List[str]) -> List[str]:
+    return [security.get_password_hash(p) for p in passwords]
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """Reparte los hashes bcrypt del lote entre los hilos del pool."""
+    if not passwords:
+        return []
+    loop = asyncio.get_running_loop()
+    n = min(HASH_WORKERS, len(passwords))
+    trozos = [passwords[i::n] for i in range(n)]
+    resultados = await asyncio.gather(*(loop.run_in_executor(_hash_pool(), _hash_lote, t) for t in trozos))
+    # Reintercalar en el orden original
+    hashes = [None] * len(passwords)
+    for i, trozo in enumerate(resultados):
+        hashes[i::n] = trozo
+    return hashes
+
+
+class ImportResponse(StreamingResponse):
+    """
+    StreamingResponse que NO escucha el disconnect en paralelo: el generador ya
+    está leyendo `receive` (el cuerpo del upload) y dos lectores se robarían los
+    mensajes. Si el cliente se desconecta, request.stream() lo detecta.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+# ==============================================================================
+#                        LECTURA EN STREAMING
+# ==============================================================================
+
+async def leer_filas(chunks: AsyncIterator[bytes], formato: str) -> AsyncIterator[Tuple[int, Dict]]:
+    """Convierte el stream de bytes en (número_de_fila, dict) sin cargar el archivo entero."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pendiente = ""
+    encabezado = None
+    fila = 0
+
+    async def lineas():
+        nonlocal pendiente
+        async for chunk in chunks:
+            pendiente += decoder.decode(chunk)
+            *completas, pendiente = pendiente.split("\n")
+            for linea in completas:
+                yield linea
+        pendiente += decoder.decode(b"", final=True)
+        if pendiente:
+            yield pendiente
+
+    async for linea in lineas():
+        linea = linea.rstrip("\r")
+        if not linea.strip():
+            continue
+        if formato == "csv":
+            valores = next(csv.reader([linea]))
+            if encabezado is None:
+                encabezado = [v.strip() for v in valores]
+                continue
+            fila += 1
+            yield fila, dict(zip(encabezado, valores))
+        else:
+            fila += 1
+            try:
+                datos = json.loads(linea)
+            except json.JSONDecodeError as exc:
+                yield fila, {"__error__": f"JSON inválido: {exc.msg}"}
+                continue
+            # Un número o una lista son JSON válido pero no una fila
+            yield fila, datos if isinstance(datos, dict) else {"__error__": "Se esperaba un objeto JSON"}
+
+
+async def por_lotes(filas: AsyncIterator[Tuple[int, Dict]], size: int = BATCH_SIZE):
+    lote = []
+    async for item in filas:
+        lote.append(item)
+        if len(lote) >= size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _error(fila: int, detalle) -> str:
+    if isinstance(detalle, ValidationError):
+        detalle = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in detalle.errors())
+    return json.dumps({"fila": fila, "error": str(detalle)}, ensure_ascii=False) + "\n"
+
+
+def _emails_existentes(emails: List[str]) -> Dict[str, int]:
+    db = database.SessionLocal()
+    try:
+        rows = db.query(users.Usuario.email, users.Usuario.id).filter(users.Usuario.email.in_(emails)).all()
+        return {email.lower(): uid for email, uid in rows}
+    finally:
+        db.close()
+
+
+def _insertar(modelo, filas: List[dict], returning=None) -> List[Optional[object]]:
+    """
+    Inserta el lote en un solo executemany. Si choca con una restricción (ej. un
+    correo registrado entre el SELECT del lote y el INSERT), reintenta fila por
+    fila para aislar las que fallan. Regresa, por fila, el id (o True sin
+    `returning`) o None si esa fila no se pudo insertar.
+    """
+    db = database.SessionLocal()
+    try:
+        stmt = insert(modelo)
+        try:
+            if returning is not None:
+                ids = db.scalars(stmt.returning(returning, sort_by_parameter_order=True), filas).all()
+            else:
+                db.execute(stmt, filas)
+                ids = [True] * len(filas)
+            db.commit()
+            return list(ids)
+        except IntegrityError:
+            db.rollback()
+
+        resultados: List[Optional[object]] = []
+        for fila in filas:
+            try:
+                if returning is not None:
+                    resultados.append(db.scalar(stmt.values(fila).returning(returning)))
+                else:
+                    db.execute(stmt.values(fila))
+                    resultados.append(True)
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                resultados.append(None)
+        return resultados
+    finally:
+        db.close()
+
+
+# ==============================================================================
+#                        IMPORTADORES
+# ==============================================================================
+
+async def importar_usuarios(chunks: AsyncIterator[bytes], formato: str) -> AsyncIterator[str]:
+    total = creados = 0
+    vistos = set()
+    async for lote in por_lotes(leer_filas(chunks, formato)):
+        validos = []
+        for fila, datos in lote:
+            total += 1
+            if "__error__" in datos:
+                yield _error(fila, datos["__error__"])
+                continue
+            try:
+                dto = auth_schemas.UsuarioCreate(**datos)
+            except (ValidationError, TypeError) as exc:
+                yield _error(fila, exc)
+                continue
+            email = dto.email.lower()
+            if email in vistos:
+                yield _error(fila, "Correo duplicado dentro del archivo")
+                continue
+            vistos.add(email)
+            validos.append((fila, dto))
+
+        if not validos:
+            continue
+
+        # Un solo SELECT ... IN para todo el lote
+        existentes = await run_in_threadpool(_emails_existentes, [dto.email for _, dto in validos])
+        nuevos = []
+        for fila, dto in validos:
+            if dto.email.lower() in existentes:
+                yield _error(fila, "El correo ya existe")
+            else:
+                nuevos.append((fila, dto))
+        if not nuevos:
+            continue
+
+        hashes = await hash_passwords([dto.password for _, dto in nuevos])
+        filas_db = [
+            {
+                "nombre_completo": dto.nombre_completo,
+                "email": dto.email,
+                "hashed_password": h,
+                "rol": "Estudiante",
+            }
+            for (_, dto), h in zip(nuevos, hashes)
+        ]
+        resultados = await run_in_threadpool(_insertar, users.Usuario, filas_db)
+        for (fila, _), ok in zip(nuevos, resultados):
+            if ok is None:
+                yield _error(fila, "El correo ya existe")
+            else:
+                creados += 1
+
+    yield json.dumps({"resumen": {"filas": total, "creados": creados, "errores": total - creados}}) + "\n"
+
+
+async def importar_solicitudes(chunks: AsyncIterator[bytes], formato: str) -> AsyncIterator[str]:
+    """Cada fila trae los campos de SolicitudCreate más `email_estudiante`."""
+    total = creadas = 0
+    async for lote in por_lotes(leer_filas(chunks, formato)):
+        validos = []
+        for fila, datos in lote:
+            total += 1
+            if "__error__" in datos:
+                yield _error(fila, datos["__error__"])
+                continue
+            email = (datos.pop("email_estudiante", None) or "").strip()
+            if not email:
+                yield _error(fila, "email_estudiante: campo requerido")
+                continue
+            if not datos.get("archivo_url"):
+                datos.pop("archivo_url", None)
+            try:
+                dto = schemas.SolicitudCreate(**datos)
+            except (ValidationError, TypeError) as exc:
+                yield _error(fila, exc)
+                continue
+            validos.append((fila, email, dto))
+
+        if not validos:
+            continue
+
+        estudiantes = await run_in_threadpool(_emails_existentes, list({e for _, e, _ in validos}))
+        filas_db = []
+        numeros = []
+        for fila, email, dto in validos:
+            estudiante_id = estudiantes.get(email.lower())
+            if estudiante_id is None:
+                yield _error(fila, f"Estudiante {email} no existe")
+                continue
+            filas_db.append({**dto.model_dump(), "estudiante_id": estudiante_id, "estado": "Abierta"})
+            numeros.append(fila)
+        if not filas_db:
+            continue
+
+        ids = await run_in_threadpool(_insertar, models.Solicitud, filas_db, models.Solicitud.id)
+        for fila, solicitud_id, datos in zip(numeros, ids, filas_db):
+            if solicitud_id is None:
+                # Ej. el estudiante se eliminó entre el SELECT del lote y el INSERT
+                yield _error(fila, "No se pudo insertar (restricción de la BD)")
+                continue
+            eventos.registrar("Solicitud", solicitud_id, None, "Abierta", datos["estudiante_id"])
+            creadas += 1
+        conteos.invalidar("Solicitudes")
+
+    if creadas:
+        hub.publicar(CANAL_MERCADO, "solicitudes_importadas", total=creadas)
+        motor.invalidar()
+    yield json.dumps({"resumen": {"filas": total, "creados": creadas, "errores": total - creadas}}) + "\n"
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.realtime import hub, CANAL_MERCADO, canal_estudiante
+from app.models import solicitudes as models, users
+from app.services.recomendaciones import motor
+from app.services import eventos
+
+# ==============================================================================
+#   ENVÍO DE OFERTAS (servicio único para /asesores/ofertar y /mercado/.../ofertar)
+#   La unicidad (solicitud_id, asesor_id) la garantiza el índice único de la BD:
+#   se inserta directo y el conflicto se detecta por IntegrityError, sin el
+#   SELECT previo que competía con otros requests.
+# ==============================================================================
+
+# Idempotency-Key: la llave y la huella del request se guardan en la propia
+# oferta (índice único asesor_id + llave), así un reintento que llega a otro
+# worker o tras un reinicio encuentra la original. Este LRU solo evita la
+# consulta en reintentos al mismo worker.
+IDEMPOTENCIA_TTL = 24 * 3600
+IDEMPOTENCIA_MAX = 10_000
+
+_idempotencia: "OrderedDict[Tuple[int, str], Tuple[int, str, float]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _huella(solicitud_id: int, precio: float, mensaje: str) -> str:
+    return hashlib.sha256(f"{solicitud_id}|{precio!r}|{mensaje}".encode()).hexdigest()
+
+
+def _recordar(asesor_id: int, key: str, oferta_id: int, huella: str):
+    with _lock:
+        _idempotencia[(asesor_id, key)] = (oferta_id, huella, time.monotonic())
+        _idempotencia.move_to_end((asesor_id, key))
+        while len(_idempotencia) > IDEMPOTENCIA_MAX:
+            _idempotencia.popitem(last=False)
+
+
+def _buscar(asesor_id: int, key: str) -> Optional[Tuple[int, str]]:
+    with _lock:
+        item = _idempotencia.get((asesor_id, key))
+        if item is None:
+            return None
+        oferta_id, huella, ts = item
+        if time.monotonic() - ts > IDEMPOTENCIA_TTL:
+            del _idempotencia[(asesor_id, key)]
+            return None
+        return oferta_id, huella
+
+
+def _oferta_por_llave(db: Session, asesor_id: int, key: str) -> Optional[models.Oferta]:
+    """Busca la oferta creada con esta llave: LRU del worker y, si no está, la BD."""
+    cacheado = _buscar(asesor_id, key)
+    if cacheado is not None:
+        oferta = db.get(models.Oferta, cacheado[0])
+        if oferta is not None:
+            return oferta
+    oferta = db.query(models.Oferta).filter(
+        models.Oferta.asesor_id == asesor_id,
+        models.Oferta.idempotency_key == key
+    ).first()
+    if oferta is not None:
+        _recordar(asesor_id, key, oferta.id, oferta.idempotency_huella)
+    return oferta
+
+
+def _replay(oferta: models.Oferta, huella: str) -> Tuple[models.Oferta, bool]:
+    if oferta.idempotency_huella != huella:
+        raise HTTPException(status_code=422, detail="Idempotency-Key ya se usó con otro request.")
+    return oferta, False
+
+
+def enviar_oferta(
+    db: Session,
+    asesor: users.Usuario,
+    solicitud_id: int,
+    precio: float,
+    mensaje: str,
+    idempotency_key: Optional[str] = None,
+) -> Tuple[models.Oferta, bool]:
+    """
+    Crea la oferta del asesor para la solicitud.
+    Regresa (oferta, creada). Con Idempotency-Key, un reintento del mismo
+    request regresa la oferta original con creada=False; la misma llave con
+    otra solicitud, precio o mensaje es un 422.
+    """
+    huella = _huella(solicitud_id, precio, mensaje) if idempotency_key else None
+
+    # 1. Reintento: la llave ya tiene oferta (aunque la solicitud ya no esté Abierta)
+    if idempotency_key:
+        existente = _oferta_por_llave(db, asesor.id, idempotency_key)
+        if existente is not None:
+            return _replay(existente, huella)
+
+    solicitud = db.get(models.Solicitud, solicitud_id)
+    if not solicitud:
+        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    if solicitud.estudiante_id == asesor.id:
+        raise HTTPException(status_code=400, detail="No puedes ofertar en tu propia solicitud")
+    if solicitud.estado != "Abierta":
+        raise HTTPException(status_code=400, detail="Esta solicitud ya no está disponible.")
+    if solicitud.fecha_limite and solicitud.fecha_limite < datetime.utcnow():
+        # Vencida aunque el scheduler aún no la haya marcado
+        raise HTTPException(status_code=400, detail="Esta solicitud ya venció.")
+    estudiante_id = solicitud.estudiante_id
+
+    # 2. Insert directo; los índices únicos resuelven las carreras
+    nueva_oferta = models.Oferta(
+        solicitud_id=solicitud_id,
+        asesor_id=asesor.id,
+        precio=precio,
+        mensaje=mensaje,
+        estado="Pendiente",
+        idempotency_key=idempotency_key,
+        idempotency_huella=huella,
+    )
+    db.add(nueva_oferta)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        if idempotency_key:
+            # ¿Chocó con la llave? Es un reintento concurrente que ganó el insert
+            existente = _oferta_por_llave(db, asesor.id, idempotency_key)
+            if existente is not None:
+                return _replay(existente, huella)
+        # Chocó con (solicitud, asesor) con otra llave o sin llave: duplicado real
+        raise HTTPException(status_code=400, detail="Ya enviaste una oferta para esta solicitud.")
+
+    db.refresh(nueva_oferta)
+    if idempotency_key:
+        _recordar(asesor.id, idempotency_key, nueva_oferta.id, huella)
+
+    # 3. Efectos secundarios (solo si realmente se creó)
+    hub.publicar(canal_estudiante(estudiante_id), "oferta_nueva",
+                 solicitud_id=solicitud_id, oferta_id=nueva_oferta.id, precio=nueva_oferta.precio)
+    hub.publicar(CANAL_MERCADO, "oferta_nueva", solicitud_id=solicitud_id)
+    motor.registrar_oferta(solicitud_id, asesor.id)
+    eventos.registrar("Oferta", nueva_oferta.id, None, "Pendiente", asesor.id)
+
+    return nueva_oferta, True
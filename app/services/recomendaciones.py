@@ -0,0 +1,377 @@
+import asyncio
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core import database
+from app.models import solicitudes as models, users
+
+# ==============================================================================
+#   MOTOR DE RECOMENDACIONES ASESOR <-> SOLICITUD
+#   Mantiene en memoria un top-K por asesor que se actualiza de forma
+#   incremental cuando llegan solicitudes u ofertas. El endpoint solo lee la
+#   lista ya calculada; la reconstrucción completa corre en una tarea de fondo.
+# ==============================================================================
+
+TOP_K = 20
+
+# Cada cuánto se reconstruye todo desde la BD (la urgencia cambia con el tiempo)
+TTL_RECONSTRUCCION = 600
+# Cada cuánto revisa la tarea de fondo si toca reconstruir (TTL o invalidación)
+INTERVALO_REVISION = 5
+
+logger = logging.getLogger(__name__)
+
+# Pesos del score
+PESO_MATERIA = 0.40
+PESO_TEMA = 0.30
+PESO_URGENCIA = 0.20
+PESO_COMPETENCIA = 0.10
+
+_STOPWORDS = {"del", "las", "los", "para", "por", "con", "una", "uno", "que", "sus"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenizar(texto: Optional[str]) -> List[str]:
+    """Minúsculas, sin acentos, sin palabras vacías."""
+    if not texto:
+        return []
+    texto = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode()
+    return [t for t in _TOKEN_RE.findall(texto) if len(t) > 2 and t not in _STOPWORDS]
+
+
+@dataclass
+class PerfilAsesor:
+    especialidad: Set[str] = field(default_factory=set)
+    historial: Counter = field(default_factory=Counter)
+    ofertadas: Set[int] = field(default_factory=set)
+
+
+@dataclass
+class SolicitudAbierta:
+    id: int
+    estudiante_id: int
+    materia: str
+    tema: str
+    fecha_limite: Optional[datetime]
+    ofertas: int = 0
+    tokens_materia: Set[str] = field(default_factory=set)
+    tokens_tema: Counter = field(default_factory=Counter)
+
+
+def _coseno(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(v * b.get(k, 0) for k, v in a.items())
+    if not dot:
+        return 0.0
+    norma = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norma
+
+
+def calcular_score(perfil: PerfilAsesor, sol: SolicitudAbierta, ahora: datetime) -> float:
+    # 1. Materia vs especialidad (fracción de la materia cubierta por la especialidad)
+    if sol.tokens_materia and perfil.especialidad:
+        materia = len(sol.tokens_materia & perfil.especialidad) / len(sol.tokens_materia)
+    else:
+        materia = 0.0
+
+    # 2. Tema vs historial de temas ofertados (coseno sobre bolsa de palabras)
+    tema = _coseno(sol.tokens_tema, perfil.historial)
+
+    # 3. Urgencia: 1.0 si vence hoy, decae con los días; vencida = 0
+    if sol.fecha_limite is None:
+        urgencia = 0.0
+    else:
+        dias = (sol.fecha_limite - ahora).total_seconds() / 86400
+        urgencia = 0.0 if dias < 0 else 1.0 / (1.0 + dias)
+
+    # 4. Competencia: menos ofertas, más oportunidad
+    competencia = 1.0 / (1.0 + sol.ofertas)
+
+    return (
+        PESO_MATERIA * materia
+        + PESO_TEMA * tema
+        + PESO_URGENCIA * urgencia
+        + PESO_COMPETENCIA * competencia
+    )
+
+
+class MotorRecomendaciones:
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self._lock = threading.RLock()
+        self._perfiles: Dict[int, PerfilAsesor] = {}
+        self._solicitudes: Dict[int, SolicitudAbierta] = {}
+        self._top: Dict[int, List[Tuple[float, int]]] = {}
+        self._sucios: Set[int] = set()
+        self._cargado_en: Optional[float] = None
+        self._invalidado = False
+        # Una sola reconstrucción a la vez (single-flight)
+        self._reconstruyendo = threading.Lock()
+        # Eventos llegados durante una reconstrucción (None = no hay una en curso)
+        self._pendientes: Optional[List[tuple]] = None
+
+    # ------------------------------------------------------------------ carga
+    def reconstruir(self, db: Session):
+        """Carga completa en 3 consultas set-based (sin N+1). Una a la vez."""
+        with self._reconstruyendo:
+            self._reconstruir(db)
+
+    def _reconstruir(self, db: Session):
+        self._invalidado = False
+        # Desde aquí los eventos incrementales se anotan además de aplicarse: la
+        # lectura de abajo puede no ver lo que se commitea mientras corre
+        with self._lock:
+            self._pendientes = []
+        try:
+            perfiles, solicitudes = self._leer_bd(db)
+        except Exception:
+            with self._lock:
+                self._pendientes = None
+            raise
+
+        with self._lock:
+            self._perfiles = perfiles
+            self._solicitudes = solicitudes
+            self._top = {}
+            self._sucios = set(perfiles)
+            self._cargado_en = time.monotonic()
+            # Se reaplica lo que llegó durante la lectura (las operaciones son
+            # idempotentes: da igual si la lectura ya lo había visto)
+            pendientes, self._pendientes = self._pendientes, None
+            for metodo, args in pendientes:
+                metodo(*args)
+
+    def _leer_bd(self, db: Session) -> Tuple[Dict[int, PerfilAsesor], Dict[int, SolicitudAbierta]]:
+        perfiles: Dict[int, PerfilAsesor] = {}
+
+        asesores = (
+            db.query(users.Usuario.id, models.PostulacionAsesor.especialidad)
+            .outerjoin(models.PostulacionAsesor, models.PostulacionAsesor.usuario_id == users.Usuario.id)
+            .filter(users.Usuario.rol == "Asesor")
+            .all()
+        )
+        for asesor_id, especialidad in asesores:
+            perfiles[asesor_id] = PerfilAsesor(especialidad=set(tokenizar(especialidad)))
+
+        historial = (
+            db.query(models.Oferta.asesor_id, models.Oferta.solicitud_id, models.Solicitud.tema)
+            .join(models.Solicitud, models.Solicitud.id == models.Oferta.solicitud_id)
+            .all()
+        )
+        for asesor_id, solicitud_id, tema in historial:
+            perfil = perfiles.get(asesor_id)
+            if perfil:
+                perfil.historial.update(tokenizar(tema))
+                perfil.ofertadas.add(solicitud_id)
+
+        ofertas_count = (
+            db.query(models.Oferta.solicitud_id, func.count(models.Oferta.id).label("n"))
+            .group_by(models.Oferta.solicitud_id)
+            .subquery()
+        )
+        abiertas = (
+            db.query(
+                models.Solicitud.id,
+                models.Solicitud.estudiante_id,
+                models.Solicitud.materia,
+                models.Solicitud.tema,
+                models.Solicitud.fecha_limite,
+                func.coalesce(ofertas_count.c.n, 0),
+            )
+            .outerjoin(ofertas_count, ofertas_count.c.solicitud_id == models.Solicitud.id)
+            .filter(models.Solicitud.estado == "Abierta")
+            .all()
+        )
+        solicitudes = {row[0]: self._nueva_solicitud(*row) for row in abiertas}
+        return perfiles, solicitudes
+
+    def asegurar_cargado(self, db: Session):
+        """
+        Solo carga en frío (antes de la primera reconstrucción de fondo): los
+        requests concurrentes esperan esa única carga en lugar de repetirla.
+        Ya cargado, regresa de inmediato aunque los datos estén por refrescarse.
+        """
+        if self._cargado_en is not None:
+            return
+        with self._reconstruyendo:
+            if self._cargado_en is None:
+                self._reconstruir(db)
+
+    def necesita_reconstruir(self) -> bool:
+        return (
+            self._cargado_en is None
+            or self._invalidado
+            or time.monotonic() - self._cargado_en > TTL_RECONSTRUCCION
+        )
+
+    def invalidar(self):
+        """Pide una reconstrucción a la tarea de fondo (ej. nuevo asesor aprobado)."""
+        self._invalidado = True
+
+    @staticmethod
+    def _nueva_solicitud(id, estudiante_id, materia, tema, fecha_limite, ofertas=0) -> SolicitudAbierta:
+        return SolicitudAbierta(
+            id=id,
+            estudiante_id=estudiante_id,
+            materia=materia,
+            tema=tema,
+            fecha_limite=fecha_limite,
+            ofertas=ofertas,
+            tokens_materia=set(tokenizar(materia)),
+            tokens_tema=Counter(tokenizar(tema)),
+        )
+
+    # ------------------------------------------------------ eventos incrementales
+    def agregar_solicitud(self, solicitud: models.Solicitud):
+        """Nueva solicitud abierta: se puntúa contra cada asesor y entra a su top si califica."""
+        self._evento(self._aplicar_solicitud, *self._datos(solicitud))
+
+    def actualizar_solicitud(self, solicitud: models.Solicitud):
+        """Cambió materia/tema/fecha: se vuelve a puntuar conservando el conteo de ofertas."""
+        self._evento(self._aplicar_solicitud, *self._datos(solicitud))
+
+    def quitar_solicitud(self, solicitud_id: int):
+        """La solicitud dejó de estar Abierta (aceptada, cancelada, expirada)."""
+        self._evento(self._aplicar_baja, solicitud_id)
+
+    def registrar_oferta(self, solicitud_id: int, asesor_id: int):
+        """Sube la competencia de la solicitud y alimenta el historial del asesor."""
+        self._evento(self._aplicar_oferta, solicitud_id, asesor_id)
+
+    def _evento(self, metodo, *args):
+        with self._lock:
+            if self._pendientes is not None:
+                self._pendientes.append((metodo, args))
+            if self._cargado_en is not None:
+                metodo(*args)
+
+    @staticmethod
+    def _datos(solicitud: models.Solicitud) -> tuple:
+        # Copia de los campos: el objeto ORM puede expirar antes de reaplicarse
+        return (solicitud.id, solicitud.estudiante_id, solicitud.materia,
+                solicitud.tema, solicitud.fecha_limite)
+
+    def _aplicar_solicitud(self, id, estudiante_id, materia, tema, fecha_limite):
+        sol = self._solicitudes.get(id)
+        if sol is None:
+            sol = self._nueva_solicitud(id, estudiante_id, materia, tema, fecha_limite)
+            self._solicitudes[id] = sol
+        else:
+            sol.materia = materia
+            sol.tema = tema
+            sol.fecha_limite = fecha_limite
+            sol.tokens_materia = set(tokenizar(materia))
+            sol.tokens_tema = Counter(tokenizar(tema))
+            # Quien la tenía en su top se recalcula; el resto la evalúa con el nuevo score
+            self._marcar_afectados(id)
+        ahora = datetime.utcnow()
+        for asesor_id, perfil in self._perfiles.items():
+            if asesor_id in self._sucios or not self._es_candidata(asesor_id, perfil, sol):
+                continue
+            self._insertar_en_top(asesor_id, calcular_score(perfil, sol, ahora), sol.id)
+
+    def _aplicar_baja(self, solicitud_id: int):
+        if self._solicitudes.pop(solicitud_id, None) is None:
+            return
+        self._marcar_afectados(solicitud_id)
+
+    def _aplicar_oferta(self, solicitud_id: int, asesor_id: int):
+        sol = self._solicitudes.get(solicitud_id)
+        if sol is None:
+            return
+        perfil = self._perfiles.get(asesor_id)
+        if perfil and solicitud_id in perfil.ofertadas:
+            # Ya contada (una oferta por asesor y solicitud; ej. la vio la reconstrucción)
+            return
+        sol.ofertas += 1
+        if perfil:
+            perfil.historial.update(sol.tokens_tema)
+            perfil.ofertadas.add(solicitud_id)
+            self._sucios.add(asesor_id)
+        # El score de la solicitud bajó para quienes la tenían en su top
+        self._marcar_afectados(solicitud_id)
+
+    # ------------------------------------------------------------------ lectura
+    def top(self, asesor_id: int, limit: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            if asesor_id not in self._perfiles:
+                return []
+            if asesor_id in self._sucios:
+                self._recalcular(asesor_id)
+            ranking = self._top.get(asesor_id, [])[: limit or self.k]
+            resultado = []
+            for score, sol_id in ranking:
+                sol = self._solicitudes[sol_id]
+                resultado.append({
+                    "solicitud_id": sol.id,
+                    "materia": sol.materia,
+                    "tema": sol.tema,
+                    "fecha_limite": sol.fecha_limite,
+                    "ofertas": sol.ofertas,
+                    "score": round(score, 4),
+                })
+            return resultado
+
+    # ---------------------------------------------------------------- internos
+    @staticmethod
+    def _es_candidata(asesor_id: int, perfil: PerfilAsesor, sol: SolicitudAbierta) -> bool:
+        return sol.estudiante_id != asesor_id and sol.id not in perfil.ofertadas
+
+    def _insertar_en_top(self, asesor_id: int, score: float, sol_id: int):
+        top = self._top.setdefault(asesor_id, [])
+        if len(top) >= self.k and score <= top[-1][0]:
+            return
+        top.append((score, sol_id))
+        top.sort(key=lambda par: par[0], reverse=True)
+        del top[self.k:]
+
+    def _marcar_afectados(self, solicitud_id: int):
+        for asesor_id, top in self._top.items():
+            if any(sol_id == solicitud_id for _, sol_id in top):
+                self._sucios.add(asesor_id)
+
+    def _recalcular(self, asesor_id: int):
+        perfil = self._perfiles[asesor_id]
+        ahora = datetime.utcnow()
+        candidatas = (
+            (calcular_score(perfil, sol, ahora), sol.id)
+            for sol in self._solicitudes.values()
+            if self._es_candidata(asesor_id, perfil, sol)
+        )
+        self._top[asesor_id] = heapq.nlargest(self.k, candidatas, key=lambda par: par[0])
+        self._sucios.discard(asesor_id)
+
+
+motor = MotorRecomendaciones()
+
+
+def _reconstruir_desde_bd():
+    db = database.SessionLocal()
+    try:
+        motor.reconstruir(db)
+    finally:
+        db.close()
+
+
+async def loop_reconstruccion(intervalo: int = INTERVALO_REVISION):
+    """Se lanza en el arranque de la app; la reconstrucción corre en un hilo."""
+    while True:
+        if motor.necesita_reconstruir():
+            try:
+                await asyncio.to_thread(_reconstruir_desde_bd)
+            except Exception:
+                logger.exception("Falló la reconstrucción de recomendaciones")
+        await asyncio.sleep(intervalo)
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app.core import database
+from app.core.lease import adquirir_lease
+from app.core.realtime import hub, CANAL_MERCADO
+from app.models import solicitudes as models
+from app.services.recomendaciones import motor
+from app.services import eventos, conteos
+
+# ==============================================================================
+#   VENCIMIENTO DE SOLICITUDES
+#   Tarea asyncio que cada INTERVALO pasa a 'Vencida' las solicitudes Abiertas
+#   cuya fecha_limite ya pasó y rechaza sus ofertas Pendientes. Trabaja en lotes
+#   de BATCH_SIZE filas por UPDATE. Con varios workers, solo el que tiene el
+#   lease de la BD ejecuta la pasada.
+# ==============================================================================
+
+INTERVALO_SEGUNDOS = 60
+BATCH_SIZE = 500
+LEASE_NOMBRE = "vencimientos"
+# El lease dura más que el intervalo para que el dueño lo renueve antes de perderlo
+LEASE_SEGUNDOS = INTERVALO_SEGUNDOS * 3
+
+logger = logging.getLogger(__name__)
+
+metricas = {
+    "ejecuciones": 0,
+    "sin_lease": 0,            # pasadas en las que otro worker tenía el lease
+    "ultimo_resultado": None,  # "ejecutada" | "sin_lease" | "error"
+    "solicitudes_vencidas": 0,
+    "ofertas_rechazadas": 0,
+    "ultima_ejecucion": None,
+    "ultima_duracion_ms": None,
+    "ultimo_lote_vencidas": 0,
+    "errores": 0,
+}
+
+
+def vencer_solicitudes(batch_size: int = BATCH_SIZE) -> int:
+    """Una pasada completa (síncrona). Regresa cuántas solicitudes venció."""
+    db = database.SessionLocal()
+    inicio = time.perf_counter()
+    total_vencidas = 0
+    total_rechazadas = 0
+    resultado = "error"
+    try:
+        if not adquirir_lease(db, LEASE_NOMBRE, LEASE_SEGUNDOS):
+            resultado = "sin_lease"
+            return 0
+
+        ahora = datetime.utcnow()
+        while True:
+            # 1. Siguiente lote de ids vencidos (usa el filtro estado + fecha_limite)
+            ids = [
+                row[0] for row in db.query(models.Solicitud.id)
+                .filter(models.Solicitud.estado == "Abierta", models.Solicitud.fecha_limite < ahora)
+                .order_by(models.Solicitud.id)
+                .limit(batch_size)
+                .all()
+            ]
+            if not ids:
+                break
+
+            # 2. UPDATEs acotados al lote; se repite el filtro de estado por si alguien
+            #    aceptó una oferta entre el SELECT y el UPDATE. RETURNING (OUTPUT
+            #    inserted.id en SQL Server) regresa solo las filas que cambiaron.
+            vencidas = db.execute(
+                update(models.Solicitud)
+                .where(models.Solicitud.id.in_(ids), models.Solicitud.estado == "Abierta")
+                .values(estado="Vencida")
+                .returning(models.Solicitud.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            rechazadas = db.execute(
+                update(models.Oferta)
+                .where(models.Oferta.solicitud_id.in_(vencidas), models.Oferta.estado == "Pendiente")
+                .values(estado="Rechazada")
+                .returning(models.Oferta.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all() if vencidas else []
+            db.commit()
+
+            for solicitud_id in vencidas:
+                eventos.registrar("Solicitud", solicitud_id, "Abierta", "Vencida")
+            for oferta_id in rechazadas:
+                eventos.registrar("Oferta", oferta_id, "Pendiente", "Rechazada")
+
+            if vencidas:
+                conteos.invalidar("Solicitudes")
+                hub.publicar(CANAL_MERCADO, "solicitudes_vencidas", solicitud_ids=vencidas)
+                for solicitud_id in vencidas:
+                    motor.quitar_solicitud(solicitud_id)
+            total_vencidas += len(vencidas)
+            total_rechazadas += len(rechazadas)
+
+            if len(ids) < batch_size:
+                break
+        resultado = "ejecutada"
+        return total_vencidas
+    finally:
+        db.close()
+        metricas["ultimo_resultado"] = resultado
+        if resultado == "sin_lease":
+            # No pisa los datos de la última pasada real
+            metricas["sin_lease"] += 1
+        else:
+            metricas["ejecuciones"] += 1
+            metricas["solicitudes_vencidas"] += total_vencidas
+            metricas["ofertas_rechazadas"] += total_rechazadas
+            metricas["ultimo_lote_vencidas"] = total_vencidas
+            metricas["ultima_ejecucion"] = datetime.utcnow().isoformat()
+            metricas["ultima_duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+
+
+async def loop_vencimientos(intervalo: int = INTERVALO_SEGUNDOS):
+    """Se lanza en el arranque de la app; el trabajo de BD corre en un hilo."""
+    while True:
+        try:
+            await asyncio.to_thread(vencer_solicitudes)
+        except Exception:
+            # Cualquier error se registra y se reintenta: si la tarea muriera,
+            # nadie volvería a vencer solicitudes
+            metricas["errores"] += 1
+            logger.exception("Falló la pasada de vencimientos")
+        await asyncio.sleep(intervalo)
@@ -0,0 +1,111 @@
+import argparse
+import logging
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.database import Base, engine
+from app.models import users, solicitudes, sistema  # noqa: F401  (registra las tablas)
+
+# ==============================================================================
+#   MIGRACIÓN DE ESQUEMA (una sola vez por despliegue, NO al arrancar la app)
+#       python -m scripts.migrar_bd
+#   create_all no toca tablas que ya existían, así que aquí se hace el resto:
+#     1. Crea las tablas nuevas.
+#     2. Agrega las columnas nuevas (todas nullable) a tablas existentes.
+#     3. Quita ofertas duplicadas por (solicitud_id, asesor_id), conservando la
+#        aceptada/finalizada o, si no hay, la más antigua.
+#     4. Crea los índices que falten (incluidos los únicos).
+#   Es idempotente: correrla otra vez no cambia nada. main.py solo verifica que
+#   los índices únicos existan y se niega a arrancar si falta alguno.
+# ==============================================================================
+
+logger = logging.getLogger("migrar_bd")
+
+# Al deduplicar, una oferta en estos estados gana sobre las demás
+ESTADOS_PRIORITARIOS = ("Aceptada", "Finalizada")
+
+
+def agregar_columnas(engine: Engine) -> list:
+    """ALTER TABLE ... ADD para las columnas del modelo que no existen en la BD."""
+    agregadas = []
+    inspector = inspect(engine)
+    existentes = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if tabla.name not in existentes:
+                continue
+            en_bd = {c["name"] for c in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name in en_bd:
+                    continue
+                if not columna.nullable:
+                    raise RuntimeError(
+                        f"{tabla.name}.{columna.name} es NOT NULL sin valor para filas existentes: "
+                        "agrégala a mano con un DEFAULT."
+                    )
+                tipo = columna.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {tabla.name} ADD {columna.name} {tipo} NULL"))
+                agregadas.append(f"{tabla.name}.{columna.name}")
+    return agregadas
+
+
+def deduplicar_ofertas(engine: Engine) -> int:
+    """Borra las ofertas repetidas por (solicitud_id, asesor_id); regresa cuántas."""
+    prioridad = ", ".join(f"'{e}'" for e in ESTADOS_PRIORITARIOS)
+    with engine.begin() as conn:
+        resultado = conn.execute(text(f"""
+            DELETE FROM Ofertas WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY solicitud_id, asesor_id
+                        ORDER BY CASE WHEN estado IN ({prioridad}) THEN 0 ELSE 1 END,
+                                 created_at, id
+                    ) AS n
+                    FROM Ofertas
+                ) AS repetidas
+                WHERE n > 1
+            )
+        """))
+        return resultado.rowcount
+
+
+def crear_indices(engine: Engine) -> list:
+    inspector = inspect(engine)
+    creados = []
+    for tabla in Base.metadata.sorted_tables:
+        en_bd = {i["name"] for i in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name not in en_bd:
+                indice.create(bind=engine)
+                creados.append(indice.name)
+    return creados
+
+
+def migrar(engine: Engine):
+    Base.metadata.create_all(bind=engine)
+    for columna in agregar_columnas(engine):
+        logger.info("Columna agregada: %s", columna)
+    borradas = deduplicar_ofertas(engine)
+    if borradas:
+        logger.info("Ofertas duplicadas eliminadas: %s", borradas)
+    for nombre in crear_indices(engine):
+        logger.info("Índice creado: %s", nombre)
+
+
+def main(argv=None) -> int:
+    argparse.ArgumentParser(description="Migración del esquema de la BD").parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        migrar(engine)
+    except SQLAlchemyError as exc:
+        logger.error("La migración falló: %s", exc)
+        return 1
+    logger.info("Esquema al día.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
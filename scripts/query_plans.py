@@ -0,0 +1,300 @@
+import argparse
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Las consultas corren contra la BD sembrada de aquí abajo, nunca contra el
+# engine de la app: que ese sea SQLite para no requerir pyodbc al importarlo
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core.database import Base  # noqa: E402
+from app.models import solicitudes as models, users, sistema  # noqa: E402,F401 (registra tablas)
+from app.controllers import admin_controller, asesores_controller, estudiantes_controller  # noqa: E402
+
+# ==============================================================================
+#   REGRESIÓN DE PLANES DE CONSULTA (para CI)
+#       python -m scripts.query_plans                       # SQLite sembrado
+#       python -m scripts.query_plans --url "mssql+pyodbc://..."    # showplan
+#   Compila cada consulta caliente, obtiene su plan y sale con código 1 si
+#   alguna hace un scan completo de Solicitudes u Ofertas, o si un endpoint por
+#   usuario ejecuta más sentencias cuando el usuario tiene más filas (N+1).
+#
+#   En CI corre como paso obligatorio (.github/workflows/ci.yml) desde la raíz
+#   del repo, junto con el chequeo de réplicas; cualquier código distinto de 0
+#   rompe el build:
+#       python -m scripts.query_plans && python -m scripts.verificar_replicas
+#   No necesita SQL Server (usa SQLite en memoria); con --url apunta a una BD
+#   de staging para revisar los planes reales de SQL Server.
+# ==============================================================================
+
+# Tablas en las que un scan completo es una regresión
+TABLAS_VIGILADAS = ("Solicitudes", "Ofertas")
+
+# Tamaño de la BD sembrada (suficiente para que el planner prefiera índices)
+N_USUARIOS = 200
+N_SOLICITUDES = 5000
+OFERTAS_POR_SOLICITUD = 3
+
+
+@dataclass
+class ConsultaCaliente:
+    nombre: str
+    construir: Callable[[Session], object]   # regresa un Query / Select
+    # Consultas que recorren la tabla en orden de un índice a propósito
+    # (listado sin filtro con LIMIT, exportación completa)
+    permite_scan_por_indice: bool = False
+
+
+AHORA = datetime(2030, 1, 1)
+
+CONSULTAS: List[ConsultaCaliente] = [
+    ConsultaCaliente("admin.get_base_query (estado)",
+                     lambda db: admin_controller.get_base_query(db, "Abierta").limit(10)),
+    ConsultaCaliente("admin.get_base_query (sin filtro)",
+                     lambda db: admin_controller.get_base_query(db).limit(10), permite_scan_por_indice=True),
+    ConsultaCaliente("admin.get_fast_export_query (estado)",
+                     lambda db: admin_controller.get_fast_export_query(db, "Abierta").limit(1000)),
+    ConsultaCaliente("admin.get_fast_export_query (completo)",
+                     lambda db: admin_controller.get_fast_export_query(db).limit(1000), permite_scan_por_indice=True),
+    ConsultaCaliente("admin.listar_solicitudes count (estado)",
+                     lambda db: db.query(models.Solicitud.id).filter(models.Solicitud.estado == "Abierta")),
+    ConsultaCaliente("mercado.ver_oportunidades (materia)",
+                     lambda db: db.query(models.Solicitud).filter(models.Solicitud.estado == "Abierta",
+                                                                 models.Solicitud.materia == "Materia 3")),
+    ConsultaCaliente("asesores.ver_mercado",
+                     lambda db: db.query(models.Solicitud).filter(models.Solicitud.estado == "Abierta")),
+    ConsultaCaliente("usuarios por email",
+                     lambda db: db.query(users.Usuario).filter(users.Usuario.email == "user7@example.com")),
+    ConsultaCaliente("estudiantes.mis_solicitudes",
+                     lambda db: db.query(models.Solicitud).filter(models.Solicitud.estudiante_id == 7)),
+    ConsultaCaliente("asesores.mis_ofertas",
+                     lambda db: db.query(models.Oferta).filter(models.Oferta.asesor_id == 7)),
+    ConsultaCaliente("ofertas: duplicado (solicitud, asesor)",
+                     lambda db: db.query(models.Oferta).filter(models.Oferta.solicitud_id == 10,
+                                                              models.Oferta.asesor_id == 7)),
+    ConsultaCaliente("vencimientos: lote vencido",
+                     lambda db: db.query(models.Solicitud.id).filter(models.Solicitud.estado == "Abierta",
+                                                                    models.Solicitud.fecha_limite < AHORA)
+                     .order_by(models.Solicitud.id).limit(500)),
+    ConsultaCaliente("analitica: ofertas modificadas",
+                     lambda db: db.query(models.Oferta.id, models.Oferta.estado)
+                     .filter(models.Oferta.modified_at >= AHORA)),
+    ConsultaCaliente("analitica: ofertas commiteadas tarde",
+                     lambda db: db.query(models.Oferta.id, models.Oferta.precio)
+                     .filter(models.Oferta.created_at >= AHORA, models.Oferta.id <= 100)),
+    ConsultaCaliente("analitica: solicitudes editadas",
+                     lambda db: db.query(models.Solicitud.id, models.Solicitud.materia)
+                     .filter(models.Solicitud.modified_at >= AHORA)),
+]
+
+
+# ==============================================================================
+#                        BD SEMBRADA
+# ==============================================================================
+
+def crear_bd_sembrada(url: str = "sqlite://") -> sessionmaker:
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        if conn.execute(text('SELECT COUNT(*) FROM "Solicitudes"')).scalar():
+            return sessionmaker(bind=engine)
+        base = datetime(2029, 1, 1)
+        conn.execute(insert(users.Usuario), [
+            {"nombre_completo": f"Usuario {i}", "email": f"user{i}@example.com",
+             "hashed_password": "x", "rol": "Asesor" if i % 2 else "Estudiante"}
+            for i in range(1, N_USUARIOS + 1)
+        ])
+        estados = ("Abierta", "EnProceso", "Finalizada", "Cancelada", "Vencida")
+        # Distribución sesgada: los usuarios 1 y 2 concentran muchas filas, así el
+        # chequeo de N+1 compara un usuario con pocas filas contra uno con muchas
+        estudiante = lambda i: 2 if i % 4 == 0 else (i % N_USUARIOS) + 1
+        asesor = lambda s, k: 1 if k == 0 and s % 4 == 0 else ((s + k) % N_USUARIOS) + 1
+
+        def estado_oferta(s: int, k: int) -> str:
+            # Solicitudes con match tienen su oferta ganadora (k == 0): así corren
+            # también las ramas de contacto de mis-solicitudes y mis-ofertas
+            estado = estados[s % len(estados)]
+            if estado == "Abierta":
+                return "Pendiente"
+            if k == 0 and estado == "EnProceso":
+                return "Aceptada"
+            if k == 0 and estado == "Finalizada":
+                return "Finalizada"
+            return "Rechazada"
+
+        conn.execute(insert(models.Solicitud), [
+            {"estudiante_id": estudiante(i), "materia": f"Materia {i % 20}", "tema": f"Tema {i}",
+             "descripcion": "d", "fecha_limite": base + timedelta(hours=i), "estado": estados[i % len(estados)],
+             "created_at": base + timedelta(minutes=i), "modified_at": base + timedelta(minutes=i)}
+            for i in range(1, N_SOLICITUDES + 1)
+        ])
+        conn.execute(insert(models.Oferta), [
+            {"solicitud_id": s, "asesor_id": asesor(s, k), "precio": 100.0 + k,
+             "mensaje": "m", "estado": estado_oferta(s, k),
+             "created_at": base + timedelta(minutes=s + k), "modified_at": base + timedelta(minutes=s + k)}
+            for s in range(1, N_SOLICITUDES + 1) for k in range(OFERTAS_POR_SOLICITUD)
+        ])
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+    return sessionmaker(bind=engine)
+
+
+# ==============================================================================
+#                        PLANES
+# ==============================================================================
+
+def compilar(db: Session, consulta) -> str:
+    stmt = getattr(consulta, "statement", consulta)
+    return str(stmt.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}))
+
+
+def plan_sqlite(db: Session, sql: str) -> List[str]:
+    return [row[-1] for row in db.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+
+def plan_mssql(db: Session, sql: str) -> List[str]:
+    """Operadores físicos del showplan estimado: 'Clustered Index Scan [Solicitudes]'."""
+    conn = db.connection()
+    conn.exec_driver_sql("SET SHOWPLAN_XML ON")
+    try:
+        xml = conn.exec_driver_sql(sql).scalar()
+    finally:
+        conn.exec_driver_sql("SET SHOWPLAN_XML OFF")
+    ns = {"sp": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+    pasos = []
+    for relop in ET.fromstring(xml).iter("{%s}RelOp" % ns["sp"]):
+        objeto = relop.find("./*/sp:Object", ns)
+        tabla = objeto.get("Table", "").strip("[]") if objeto is not None else ""
+        pasos.append(f"{relop.get('PhysicalOp')} [{tabla}]")
+    return pasos
+
+
+def scans_prohibidos(dialecto: str, plan: List[str], permite_scan_por_indice: bool) -> List[str]:
+    malos = []
+    for paso in plan:
+        for tabla in TABLAS_VIGILADAS:
+            if dialecto == "sqlite":
+                m = re.match(rf"SCAN {tabla}\b(.*)", paso)
+                if not m:
+                    continue
+                por_indice = "USING" in m.group(1) and "INDEX" in m.group(1)
+            else:
+                if f"[{tabla}]" not in paso or "Scan" not in paso:
+                    continue
+                por_indice = paso.startswith("Index Scan")
+            if not por_indice or not permite_scan_por_indice:
+                malos.append(paso)
+    return malos
+
+
+# ==============================================================================
+#                        N+1
+# ==============================================================================
+
+@contextmanager
+def contar_sentencias(db: Session):
+    contador = {"n": 0}
+
+    def _contar(*args):
+        contador["n"] += 1
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", _contar)
+    try:
+        yield contador
+    finally:
+        event.remove(engine, "before_cursor_execute", _contar)
+
+
+def detectar_n_mas_1(SessionLocal: sessionmaker) -> List[str]:
+    """Un endpoint por usuario no debe ejecutar una sentencia extra por cada fila del usuario."""
+    db = SessionLocal()
+    fallas = []
+    try:
+        # Usuarios con distinta cantidad de filas propias
+        por_estudiante = dict(db.execute(text(
+            'SELECT estudiante_id, COUNT(*) FROM "Solicitudes" GROUP BY estudiante_id')).all())
+        por_asesor = dict(db.execute(text(
+            'SELECT asesor_id, COUNT(*) FROM "Ofertas" GROUP BY asesor_id')).all())
+        casos = [
+            ("estudiantes.mis_solicitudes", estudiantes_controller.mis_solicitudes, por_estudiante),
+            ("asesores.mis_ofertas", asesores_controller.mis_ofertas, por_asesor),
+        ]
+        for nombre, endpoint, conteos in casos:
+            if len(conteos) < 2:
+                continue
+            poco = min(conteos, key=conteos.get)
+            mucho = max(conteos, key=conteos.get)
+            resultados = []
+            for usuario_id in (poco, mucho):
+                db.expunge_all()
+                with contar_sentencias(db) as c:
+                    endpoint(f"user{usuario_id}@example.com", db)
+                resultados.append(c["n"])
+            # selectinload parte el IN en bloques de 500 ids: eso agrega alguna
+            # sentencia, pero un N+1 crece con cada fila
+            if resultados[1] - resultados[0] > (conteos[mucho] - conteos[poco]) // 100:
+                fallas.append(
+                    f"{nombre}: {resultados[0]} sentencias con {conteos[poco]} filas, "
+                    f"{resultados[1]} con {conteos[mucho]} filas (N+1)"
+                )
+    finally:
+        db.close()
+    return fallas
+
+
+# ==============================================================================
+#                        EJECUCIÓN
+# ==============================================================================
+
+def verificar(url: str = "sqlite://", verbose: bool = False) -> List[str]:
+    SessionLocal = crear_bd_sembrada(url)
+    db = SessionLocal()
+    dialecto = db.get_bind().dialect.name
+    fallas = []
+    try:
+        for consulta in CONSULTAS:
+            sql = compilar(db, consulta.construir(db))
+            plan = plan_sqlite(db, sql) if dialecto == "sqlite" else plan_mssql(db, sql)
+            malos = scans_prohibidos(dialecto, plan, consulta.permite_scan_por_indice)
+            if verbose or malos:
+                print(f"\n== {consulta.nombre}\n{sql}\n  " + "\n  ".join(plan))
+            for paso in malos:
+                fallas.append(f"{consulta.nombre}: {paso}")
+    finally:
+        db.close()
+    fallas.extend(detectar_n_mas_1(SessionLocal))
+    return fallas
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Regresión de planes de las consultas calientes")
+    parser.add_argument("--url", default="sqlite://", help="BD a usar (default: SQLite en memoria)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Imprime SQL y plan de todas las consultas")
+    args = parser.parse_args(argv)
+
+    fallas = verificar(args.url, args.verbose)
+    if fallas:
+        print("\nREGRESIONES DE PLAN:")
+        for falla in fallas:
+            print(f"  - {falla}")
+        return 1
+    print(f"OK: {len(CONSULTAS)} consultas sin scans completos, sin N+1.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+# Primario y réplica son archivos SQLite temporales: el engine de la app
+# también debe ser SQLite para importar database sin pyodbc
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core import database  # noqa: E402
+
+# ==============================================================================
+#   VERIFICACIÓN DEL RUTEO A RÉPLICAS (para CI)
+#       python -m scripts.verificar_replicas
+#   Usa dos archivos SQLite locales como primario y réplica (cada uno con una
+#   marca distinta) y revisa que get_read_db lea de la réplica, que el header
+#   x-read-primary y RUTAS_PRIMARIO fuercen el primario, que una réplica caída
+#   haga fallback al primario y que un health check lento no bloquee lecturas.
+#   Sale con código 1 si algo falla (corre en CI, ver scripts/query_plans.py).
+# ==============================================================================
+
+# Tiempo máximo que puede tardar get_read_db con un health check colgado
+MAX_ESPERA_LECTURA = 0.2
+
+
+def _crear_bd(ruta: str, marca: str) -> str:
+    url = f"sqlite:///{ruta}"
+    engine = database.crear_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE Marca (origen VARCHAR(20))"))
+        conn.execute(text("INSERT INTO Marca VALUES (:m)"), {"m": marca})
+    engine.dispose()
+    return url
+
+
+def _request(path: str = "/lectura", headers: dict = None) -> Request:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [(k.encode(), v.encode()) for k, v in (headers or {}).items()],
+        "route": SimpleNamespace(path=path),
+    }
+    return Request(scope)
+
+
+def _leer(request: Request) -> str:
+    """Ejecuta get_read_db como lo haría FastAPI y regresa de qué BD leyó."""
+    gen = database.get_read_db(request)
+    db = next(gen)
+    try:
+        return db.execute(text("SELECT origen FROM Marca")).scalar()
+    finally:
+        gen.close()
+
+
+def _esperar_health_checks(router: database.ReadRouter, timeout: float = 5.0):
+    limite = time.monotonic() + timeout
+    while any(r.verificando for r in router.replicas) and time.monotonic() < limite:
+        time.sleep(0.01)
+
+
+def verificar() -> List[str]:
+    fallas = []
+    originales = (database.SessionLocal, database.read_router, set(database.RUTAS_PRIMARIO))
+    with tempfile.TemporaryDirectory() as tmp:
+        url_primario = _crear_bd(os.path.join(tmp, "primario.sqlite"), "primario")
+        url_replica = _crear_bd(os.path.join(tmp, "replica.sqlite"), "replica")
+        database.SessionLocal = sessionmaker(bind=database.crear_engine(url_primario))
+        try:
+            def esperar(nombre: str, obtenido: str, esperado: str):
+                if obtenido != esperado:
+                    fallas.append(f"{nombre}: leyó de '{obtenido}', se esperaba '{esperado}'")
+
+            # 1. Réplica sana: las lecturas van a la réplica (tras su primer health check)
+            router = database.ReadRouter([url_replica])
+            database.read_router = router
+            esperar("sin health check previo", _leer(_request()), "primario")
+            _esperar_health_checks(router)
+            esperar("réplica sana", _leer(_request()), "replica")
+
+            # 2. Header de read-your-writes
+            esperar(f"header {database.HEADER_PRIMARIO}",
+                    _leer(_request(headers={database.HEADER_PRIMARIO: "1"})), "primario")
+
+            # 3. Ruta forzada al primario
+            database.RUTAS_PRIMARIO.add("/solo-primario")
+            esperar("RUTAS_PRIMARIO", _leer(_request("/solo-primario")), "primario")
+            esperar("ruta normal", _leer(_request()), "replica")
+
+            # 4. Réplica caída (directorio inexistente): fallback al primario
+            caida = os.path.join(tmp, "no-existe", "replica.sqlite")
+            router = database.ReadRouter([f"sqlite:///{caida}"])
+            database.read_router = router
+            _leer(_request())
+            _esperar_health_checks(router)
+            esperar("réplica caída", _leer(_request()), "primario")
+            if router.replicas[0].sana:
+                fallas.append("réplica caída: el health check la marcó como sana")
+
+            # 5. Un health check colgado no bloquea las lecturas
+            router = database.ReadRouter([url_replica])
+            database.read_router = router
+            router.replicas[0].verificar = lambda: time.sleep(1.0)
+            inicio = time.perf_counter()
+            esperar("health check colgado", _leer(_request()), "primario")
+            espera = time.perf_counter() - inicio
+            if espera > MAX_ESPERA_LECTURA:
+                fallas.append(f"health check colgado: la lectura esperó {espera:.2f}s")
+        finally:
+            database.SessionLocal, database.read_router = originales[0], originales[1]
+            database.RUTAS_PRIMARIO.clear()
+            database.RUTAS_PRIMARIO.update(originales[2])
+    return fallas
+
+
+def main(argv=None) -> int:
+    argparse.ArgumentParser(description="Verificación del ruteo de lecturas a réplicas").parse_args(argv)
+    fallas = verificar()
+    if fallas:
+        print("FALLAS DE RUTEO A RÉPLICAS:")
+        for falla in fallas:
+            print(f"  - {falla}")
+        return 1
+    print("OK: réplica, header, RUTAS_PRIMARIO, fallback y health check sin bloqueo.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())